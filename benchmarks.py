@@ -0,0 +1,118 @@
+# benchmarks.py
+"""
+性能基准测试（离线，不发起网络请求）
+
+用法:
+    python benchmarks.py
+"""
+
+import ipaddress
+import random
+import time
+
+import proxy_sources
+
+
+def _timed(func, *args, rounds=3):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _fake_proxy_list(count, dup_ratio=0.1):
+    """生成 monosans 格式（IP:PORT 每行一条）的代理列表，约 dup_ratio 的行重复"""
+    lines = [
+        f"{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"
+        f":{random.randint(1, 65535)}"
+        for _ in range(count)
+    ]
+    lines += random.sample(lines, int(count * dup_ratio))
+    random.shuffle(lines)
+    return ("\n".join(lines) + "\n").encode()
+
+
+def _legacy_parse_monosans(body):
+    """原实现: 解码、逐行 split、ipaddress 校验"""
+    proxies = []
+    for line in body.decode().strip().split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            parts = line.split(':')
+            if len(parts) != 2:
+                continue
+            host = parts[0].strip()
+            port = int(parts[1].strip())
+            ipaddress.ip_address(host)
+            proxies.append(proxy_sources.ProxyInfo(
+                host=host, port=port, proxy_type='socks5',
+                country_code="UNKNOWN", source="monosans"
+            ))
+        except (ValueError, IndexError):
+            continue
+    return proxies
+
+
+def bench_proxy_parse(sizes=(1000, 10000, 50000, 100000)):
+    """对比逐行解析与 bytes 正则流式解析（含去重）"""
+    print("\n[解析] 纯文本代理列表")
+    print(f"{'行数':>10} {'逐行(ms)':>12} {'流式(ms)':>12} {'加速比':>8} {'去重后':>8}")
+    for size in sizes:
+        body = _fake_proxy_list(size)
+
+        legacy = {(p.host, p.port) for p in _legacy_parse_monosans(body)}
+        parsed = proxy_sources._parse_monosans(body)
+        assert {(p.host, p.port) for p in parsed} == legacy
+        assert len(parsed) == len(legacy)
+
+        t_old = _timed(_legacy_parse_monosans, body)
+        t_new = _timed(proxy_sources._parse_monosans, body)
+        lines = body.count(b"\n")
+        print(f"{lines:>10} {t_old * 1000:>12.2f} {t_new * 1000:>12.2f} {t_old / t_new:>7.2f}x {len(parsed):>8}")
+
+
+def _fake_tomcat_page(rows):
+    """生成与 Tomcat1235 代理列表页结构相同的 HTML"""
+    protocols = ["https", "socks5", "http", "socks4"]
+    body = "".join(
+        f"<tr><td>{random.choice(protocols)}</td>"
+        f"<td>{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}</td>"
+        f"<td>{random.randint(1, 65535)}</td><td>US</td><td><span>{random.randint(1, 999)} ms</span></td></tr>\n"
+        for _ in range(rows)
+    )
+    return (
+        "<html><head><title>proxy list</title></head><body><div class='list'><table>"
+        "<tr><th>协议</th><th>IP</th><th>端口</th><th>国家</th><th>延迟</th></tr>\n"
+        f"{body}</table></div></body></html>"
+    ).encode()
+
+
+def bench_tomcat_parse(sizes=(100, 1000, 5000, 20000)):
+    """对比 BeautifulSoup 与 lxml iterparse 解析 HTML 代理表格"""
+    if proxy_sources.etree is None:
+        print("未安装 lxml,跳过 HTML 解析基准")
+        return
+
+    parse_with = lambda rows, body: proxy_sources._parse_tomcat1235(body, rows)
+    bs4_rows = proxy_sources._tomcat1235_rows_bs4
+    lxml_rows = proxy_sources._tomcat1235_rows_lxml
+
+    print("\n[解析] Tomcat1235 HTML 表格")
+    print(f"{'行数':>10} {'bs4(ms)':>12} {'lxml(ms)':>12} {'加速比':>8}")
+    for size in sizes:
+        body = _fake_tomcat_page(size)
+        expected = [(p.host, p.port, p.type) for p in parse_with(bs4_rows, body)]
+        assert [(p.host, p.port, p.type) for p in parse_with(lxml_rows, body)] == expected
+
+        t_bs4 = _timed(parse_with, bs4_rows, body)
+        t_lxml = _timed(parse_with, lxml_rows, body)
+        print(f"{size:>10} {t_bs4 * 1000:>12.2f} {t_lxml * 1000:>12.2f} {t_bs4 / t_lxml:>7.2f}x")
+
+
+if __name__ == "__main__":
+    bench_proxy_parse()
+    bench_tomcat_parse()
@@ -0,0 +1,129 @@
+# checkpoint.py
+"""
+扫描断点（追加写 JSONL）
+
+每条记录一行，只追加不改写，写入成本与一次 write + flush 相当:
+  plan     采样计划（测试 IP 列表、直连落地地区）
+  proxies  某地区验证通过的代理
+  probe    某个 IP 的一次探测（含失败，results 为空列表）
+  done     某地区扫描完成
+
+进程被中断时最后一行可能不完整，读取时忽略无法解析的行。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from config import CHECKPOINT_FILE
+from proxy_sources import ProxyInfo
+
+
+class ScanState:
+    """从断点文件恢复出的扫描状态"""
+
+    def __init__(self):
+        self.plan = None
+        self.proxies = {}       # region -> [ProxyInfo]
+        self.results = {}       # region -> [result]
+        self.probed = {}        # region -> {ip}
+        self.done = set()
+
+    def region_results(self, region):
+        return self.results.get(region, [])
+
+    def region_probed(self, region):
+        return self.probed.get(region, set())
+
+
+class Checkpoint:
+    """追加写的扫描断点，线程安全"""
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+                if self._file.tell() and not self._ends_with_newline():
+                    self._file.write("\n")     # 上次中断留下的半行单独成行
+            self._file.write(line)
+            self._file.flush()
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def start(self, ips, direct_region):
+        """开始新的扫描: 清空旧断点并写入采样计划"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._append({
+            "t": "plan",
+            "ts": int(time.time()),
+            "ips": ips,
+            "direct_region": direct_region,
+        })
+
+    def record_proxies(self, region, proxies):
+        self._append({"t": "proxies", "region": region, "proxies": [p.to_dict() for p in proxies]})
+
+    def record_probe(self, region, ip, results):
+        self._append({"t": "probe", "region": region, "ip": str(ip), "results": results})
+
+    def mark_done(self, region):
+        self._append({"t": "done", "region": region})
+
+    def load(self):
+        """读取断点；文件不存在或没有采样计划时返回 None"""
+        if not os.path.exists(self.path):
+            return None
+
+        state = ScanState()
+        skipped = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+
+                kind = record.get("t")
+                region = record.get("region")
+                if kind == "plan":
+                    state.plan = record
+                elif kind == "proxies":
+                    state.proxies[region] = [ProxyInfo.from_dict(d) for d in record["proxies"]]
+                elif kind == "probe":
+                    state.probed.setdefault(region, set()).add(record["ip"])
+                    state.results.setdefault(region, []).extend(record["results"])
+                elif kind == "done":
+                    state.done.add(region)
+
+        if skipped:
+            logging.warning(f"断点文件中有 {skipped} 行无法解析,已忽略")
+        if state.plan is None:
+            return None
+        return state
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def clear(self):
+        """扫描正常完成后删除断点"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -13,6 +13,12 @@ import logging
 # ======================
 OUTPUT_DIR = "public"
 DATA_DIR = os.path.join(OUTPUT_DIR, "data")
+CHECKPOINT_FILE = os.path.join(DATA_DIR, "checkpoint.jsonl")   # 扫描断点（--resume）
+SHARD_FILE_PATTERN = os.path.join(DATA_DIR, "shard-{index}-of-{count}.json.gz")   # 分片部分结果
+SHARD_VNODES = 64                    # 一致性哈希环上每个分片的虚拟节点数
+CACHE_DIR = ".cache"                 # 跨运行缓存，不在 public/ 下，避免随页面发布；CI 用 actions/cache 恢复
+HTTP_CACHE_DIR = os.path.join(CACHE_DIR, "http")         # 条件请求缓存（ETag / Last-Modified）
+HTTP_CACHE_STALE_IF_ERROR = 7 * 24 * 3600                # 请求失败时可退回使用的缓存最大年龄（秒）
 
 # ======================
 # Cloudflare 相关
@@ -21,7 +27,24 @@ CF_IPS_V4_URL = "https://www.cloudflare.com/ips-v4"
 
 TRACE_DOMAIN = "sptest.ittool.pp.ua"
 
+# 多域名评分使用的测试域名（与 ip_v6 相同）
+TRACE_DOMAINS = {
+    "v0": TRACE_DOMAIN,
+    "v1": "sptest1.ittool.pp.ua",
+    "v2": "sptest2.ittool.pp.ua",
+}
+
+# 评分策略
+# "single": 只测 TRACE_DOMAIN，按延迟评分
+# "multi": 并发测试 TRACE_DOMAINS，按稳定性 × 一致性 × 延迟评分
+SCORING_STRATEGY = "single"
+
 HTTPS_PORTS = [443, 8443, 2053, 2083, 2087, 2096]
+PROBE_PORT = 443                   # 扫描阶段探测的端口
+
+# 端口探测: 仅对最终发布的短名单节点逐个端口验证，发布延迟最低的可用端口
+PORT_SWEEP_ENABLED = True
+PORT_SWEEP_WORKERS = 24
 
 # ======================
 # 扫描 & 测试参数
@@ -34,11 +57,52 @@ MAX_WORKERS = 24
 LATENCY_LIMIT = 1300
 
 PROXY_TEST_TIMEOUT = 10
+PROXY_SOURCE_DEADLINE = 20           # 并行获取代理数据源的共同截止时间（秒），超时的数据源被放弃
+PROXIFLY_HEDGE_DELAY = 3.0           # Proxifly JSON 超过该秒数未返回时并发请求 TXT
+PARSE_CHUNK_SIZE = 64 * 1024         # 纯文本代理列表按块解析的块大小（字节）
+
+# 自适应并发: 每条路径（直连 / 每个代理 / 代理检测 API）独立调整在途上限
+# initial / min_limit / max_limit: 初始、最小、最大并发；stall_after: 失败且耗时超过该秒数视为超时
+CONCURRENCY_LIMITS = {
+    "direct":    {"initial": MAX_WORKERS, "min_limit": 4, "max_limit": 160, "stall_after": CONNECT_TIMEOUT + 2},
+    "proxy":     {"initial": 8,           "min_limit": 2, "max_limit": 32,  "stall_after": CONNECT_TIMEOUT + 2},
+    "check_api": {"initial": MAX_WORKERS, "min_limit": 4, "max_limit": 48,  "stall_after": PROXY_TEST_TIMEOUT},
+}
+CONCURRENCY_WINDOW = 40              # 统计窗口（最近 N 次完成）
+CONCURRENCY_TIMEOUT_RATE = 0.3       # 窗口内超时比例超过该值时减半
+CONCURRENCY_LATENCY_TOLERANCE = 3.0  # 耗时不超过最小耗时的该倍数才继续加并发
+
+# 运行时间预算（python ip.py --budget 分钟）: 预留给输出阶段的秒数
+DEADLINE_OUTPUT_RESERVE = 240
+DEADLINE_MIN_REGION_PROBES = 12      # 时间紧张时每个地区至少探测的 IP 数
+
+# 对冲探测: 代理探测超过该代理 p90 耗时仍未返回时，换一条健康路径重复探测
+HEDGE_ENABLED = True
+HEDGE_BUDGET_RATIO = 0.05          # 额外探测最多占主探测的 5%
+HEDGE_DEFAULT_DELAY = CONNECT_TIMEOUT  # 样本不足时的对冲等待（秒）
+HEDGE_MIN_DELAY = 1.0
+HEDGE_MIN_SAMPLES = 5
+HEDGE_MIN_SUCCESS_RATE = 0.3       # 低于该成功率的代理不作为对冲路径
+HEDGE_WINDOW = 50                  # 统计窗口（最近 N 次探测）
+
+# 代理池: 每次探测在未满载的代理中随机取两个，选 延迟EWMA × (在途 + 1) / 成功率 较小者
+# （power of two choices），流量随实时健康度流向正在正常工作的代理
+PROXY_POOL_EWMA_ALPHA = 0.2          # 成功率 / 延迟 EWMA 的平滑系数
+PROXY_POOL_MIN_SUCCESS = 0.05        # 计算代价时的成功率下限（避免除零）
+PROXY_POOL_EXPLORE = 0.05            # 随机选代理的概率，让失败过的代理有机会恢复
+PROXY_POOL_MAX_IN_FLIGHT = MAX_WORKERS * 4   # 一个地区所有代理合计的在途探测上限
+
 PROXY_MAX_LATENCY = 1500
 SOCKS5_MAX_LATENCY = 1500
 
 MAX_OUTPUT_PER_REGION = 6
 MAX_PROXIES_PER_REGION = 6
+MAX_JSON_NODES = 200
+
+# 输出多样性约束: 避免同一 /24 或同一 colo 的节点同时失效
+DIVERSITY_MAX_PER_SUBNET = 2       # 每个 /24 最多输出节点数
+DIVERSITY_MIN_COLOS = 2            # 每地区至少覆盖的 colo 数
+DIVERSITY_POOL_FACTOR = 5          # 候选池 = 输出数 × 该倍数
 
 # ======================
 # 代理检测 API
@@ -46,6 +110,51 @@ MAX_PROXIES_PER_REGION = 6
 PROXY_CHECK_API_URL = "https://prcheck.ittool.pp.ua/check"
 PROXY_CHECK_API_TOKEN = "588wbb"
 
+# 代理检测方式
+# "api": 只用上面的检测 API
+# "local": 本地检测（validator.py），通过代理建立隧道 + TLS 握手 + 请求 /cdn-cgi/trace
+# "local_first": 先本地检测；本地一个都没通过（多为本机出站受限）时改用 API
+PROXY_VALIDATOR = "api"
+VALIDATOR_TARGET = (TRACE_DOMAIN, 443, "/cdn-cgi/trace")   # (主机, 端口, 路径)
+VALIDATOR_CONCURRENCY = 200          # 本地检测的最大并发连接数
+VALIDATOR_TIMEOUT = PROXY_TEST_TIMEOUT
+VALIDATOR_FETCH_TRACE = True         # 请求 trace 以获得出口 IP 与国家码
+
+# 存活预检: 完整检测前并发探测全部候选代理，只把有响应的交给检测
+LIVENESS_CHECK = True
+LIVENESS_HANDSHAKE = True            # True: 完成 SOCKS5 / CONNECT 握手；False: 只做 TCP 建连
+LIVENESS_TIMEOUT = 3.0
+LIVENESS_CONCURRENCY = 500
+
+# 协议探测: 保留 http / socks4 / 无前缀的代理，握手不符时用一次连接区分 SOCKS5 / SOCKS4 / HTTP，
+# 再确认 HTTP 代理是否支持 CONNECT，按实际协议改写代理类型
+PROTOCOL_DETECT = True
+PROTOCOL_DETECT_TIMEOUT = 3.0
+
+# 落地 colo 分类: 检测通过的代理再经代理请求一次 Cloudflare 端点，按 CF-Ray 的 colo
+# 判断实际落地地区并把代理分配给该地区（无法判断的留在原地区）；结果按代理缓存
+COLO_CLASSIFY = True
+COLO_CACHE_FILE = os.path.join(CACHE_DIR, "proxy_colo.json")
+COLO_CACHE_TTL = 24 * 3600           # 缓存有效期（秒），免费代理的出口会变化
+
+# ======================
+# 外部端点限速（令牌桶）
+# ======================
+# rate: 每秒请求数, burst: 最大突发
+RATE_LIMITS = {
+    # 检测 API 没有公开的速率限制；按引入限速前的实际吞吐设置: MAX_WORKERS (24) 个并发、
+    # 单次约 2 秒（代理延迟上限 1.5s + API 往返）≈ 12 次/秒，突发与原先同时提交的 24 个一致。
+    # 真实限制更低时由 429/503 + Retry-After 退避兜底
+    "proxy_check_api": {"rate": 12.0, "burst": MAX_WORKERS},
+    "proxifly":        {"rate": 5.0, "burst": 10},
+    "proxydaily":      {"rate": 1.0, "burst": 2},
+    "tomcat1235":      {"rate": 1.0, "burst": 1},
+    "monosans":        {"rate": 2.0, "burst": 4},
+}
+RATE_LIMIT_MAX_RETRIES = 3           # 429/503 最多重试次数
+RATE_LIMIT_DEFAULT_BACKOFF = 2.0     # 无 Retry-After 时的初始退避（秒）
+RATE_LIMIT_MAX_RETRY_AFTER = 60      # Retry-After 上限（秒）
+
 # ======================
 # 地区配置（完整版）
 # ======================
@@ -222,16 +331,20 @@ LOG_LEVEL = "INFO"
 def get_generated_time():
     return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')
 
+def _parse_cidrs(body):
+    return [
+        line.strip()
+        for line in body.decode("utf-8", errors="ignore").splitlines()
+        if line.strip() and not line.startswith("#")
+    ]
+
+
 def fetch_cf_ipv4_cidrs():
-    """统一获取 Cloudflare IPv4 CIDR"""
+    """统一获取 Cloudflare IPv4 CIDR（条件请求缓存，几乎总是 304）"""
+    # httpcache 依赖 config，在函数内导入避免循环导入
+    from httpcache import cached_get
     try:
-        r = requests.get(CF_IPS_V4_URL, timeout=10)
-        r.raise_for_status()
-        return [
-            line.strip()
-            for line in r.text.splitlines()
-            if line.strip() and not line.startswith("#")
-        ]
+        return cached_get("cloudflare", CF_IPS_V4_URL, _parse_cidrs, parse_key="cidrs", timeout=10)
     except Exception as e:
         logging.error(f"获取 Cloudflare IP 段失败: {e}")
         return []
\ No newline at end of file
@@ -0,0 +1,124 @@
+# httpcache.py
+"""
+磁盘 HTTP 缓存（条件请求）
+
+响应体与 ETag / Last-Modified 一起保存在 HTTP_CACHE_DIR，下次请求带上
+If-None-Match / If-Modified-Since：
+  304       复用缓存的响应体；内容未变时连解析结果也直接复用
+  请求失败  缓存不超过 HTTP_CACHE_STALE_IF_ERROR 秒时退回缓存内容（stale-if-error）
+
+解析结果以 pickle 保存，只在响应体内容哈希一致时使用；文件名取 parse_key 的哈希，
+调用方把影响解析输出的设置放进 parse_key，设置改变后自然重新解析。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+from config import HTTP_CACHE_DIR, HTTP_CACHE_STALE_IF_ERROR
+from ratelimit import rate_limited_get
+
+
+def _key(url, params=None):
+    raw = url if not params else f"{url}?{sorted(params.items())}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _path(key, suffix):
+    return os.path.join(HTTP_CACHE_DIR, f"{key}.{suffix}")
+
+
+def _write_atomic(path, data):
+    os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _load_meta(key):
+    try:
+        with open(_path(key, "json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(_path(key, "body"), "rb") as f:
+            return meta, f.read()
+    except (OSError, ValueError):
+        return None, None
+
+
+def _load_parsed(key, parse_key, digest):
+    try:
+        with open(_path(key, f"{parse_key}.pkl"), "rb") as f:
+            stamp, result = pickle.load(f)
+    except Exception:
+        # 文件不存在、损坏或类定义已变化: 重新解析
+        return None
+    return result if stamp == digest else None
+
+
+def cached_get(endpoint, url, parse, parse_key="parsed", getter=rate_limited_get, **kwargs):
+    """
+    带条件请求缓存的 GET，返回 parse(响应体 bytes) 的结果
+
+    parse_key: 解析结果的缓存名，同一 URL 用不同方式或不同设置解析时需区分
+    getter: 实际发请求的函数，签名同 rate_limited_get(endpoint, url, **kwargs)
+    """
+    key = _key(url, kwargs.get("params"))
+    parse_key = hashlib.sha1(parse_key.encode("utf-8")).hexdigest()[:12]
+    meta, cached_body = _load_meta(key)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = getter(endpoint, url, headers=headers, **kwargs)
+        if response.status_code == 304 and cached_body is not None:
+            body, fresh = cached_body, False
+            logging.debug(f"[{endpoint}] 304 未修改,使用缓存")
+        else:
+            response.raise_for_status()
+            body, fresh = response.content, True
+    except Exception as e:
+        age = time.time() - meta["fetched_at"] if meta else None
+        if cached_body is None or age > HTTP_CACHE_STALE_IF_ERROR:
+            raise
+        logging.warning(f"[{endpoint}] 请求失败 ({e}),使用 {int(age / 60)} 分钟前的缓存")
+        body, fresh, response = cached_body, False, None
+
+    digest = hashlib.sha1(body).hexdigest()
+    result = _load_parsed(key, parse_key, digest)
+    if result is None:
+        result = parse(body)
+        try:
+            _write_atomic(_path(key, f"{parse_key}.pkl"), pickle.dumps((digest, result)))
+        except (OSError, pickle.PicklingError) as e:
+            logging.debug(f"[{endpoint}] 解析结果缓存失败: {e}")
+
+    # 解析成功后才更新缓存，避免把错误页面当作有效内容保存
+    if fresh:
+        try:
+            _write_atomic(_path(key, "body"), body)
+            _write_atomic(_path(key, "json"), json.dumps({
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }).encode("utf-8"))
+        except OSError as e:
+            logging.debug(f"[{endpoint}] 写入缓存失败: {e}")
+    elif response is not None and meta:
+        meta["fetched_at"] = time.time()      # 304: 内容仍然有效，刷新时间
+        try:
+            _write_atomic(_path(key, "json"), json.dumps(meta).encode("utf-8"))
+        except OSError:
+            pass
+
+    return result
@@ -6,20 +6,26 @@ import requests
 import os
 import json
 import time
+import argparse
 import logging
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import signal
+import threading
+from functools import partial
+from itertools import takewhile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 from config import *
-from proxy_sources import (
-    ProxyInfo,
-    fetch_proxifly_proxies,
-    fetch_proxydaily_proxies,
-    fetch_tomcat1235_proxies,
-    fetch_monosans_socks5_proxies
-)
+from proxy_sources import ProxyInfo, dedupe_proxies, fetch_all_sources
 from tests import check_proxy_with_api, run_internal_tests
+from validator import check_proxy_local, detect_protocols, filter_alive, validate_many
+from ranking import top_k_nodes, select_diverse, StreamingRanker, RegionAccumulator
+from checkpoint import Checkpoint
+from landing import LandingAssigner, LandingCache
+from sharding import (
+    RecordingRanker, load_partials, merge_partials, parse_shard_spec, shard_plan, write_partial
+)
+from scheduler import Deadline, HedgedProber, LimiterRegistry, ProxyPool, path_label, stream_map
 
 
 # ────────────────────────────────────────────────
@@ -31,120 +37,294 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
+# 各探测路径的自适应并发上限（直连 / 每个代理 / 代理检测 API）
+# 进程启动时刻（墙钟）: 时间预算从这里算起，自检与获取 IP 段的耗时也计入
+STARTED_AT = time.time()
 
-def curl_test(ip, proxy=None):
-    """单域名测试连通性 + 延迟 + colo"""
-    try:
-        cmd = ["curl", "-k", "-o", "/dev/null", "-s"]
-
-        if proxy:
-            # ⚠️ 优化：使用 get_proxy_url() 方法简化代码
-            if proxy.type in ['socks5', 'socks4']:
-                # SOCKS5 代理
-                if proxy.api_result and proxy.api_result.get("username"):
-                    username = proxy.api_result["username"]
-                    password = proxy.api_result["password"]
-                    proxy_url = f"{username}:{password}@{proxy.host}:{proxy.port}"
-                else:
-                    proxy_url = f"{proxy.host}:{proxy.port}"
-                cmd.extend(["--socks5", proxy_url])
-            else:
-                # HTTPS/HTTP 代理 - 使用新方法
-                proxy_url = proxy.get_proxy_url("http")
-                cmd.extend(["-x", proxy_url])
-
-        cmd.extend([
-            "-w", "%{time_connect} %{time_appconnect} %{http_code}",
-            "--http1.1",
-            "--connect-timeout", str(CONNECT_TIMEOUT + 2),
-            "--max-time", str(TIMEOUT + 3),
-            "--resolve", f"{TRACE_DOMAIN}:443:{ip}",
-            f"https://{TRACE_DOMAIN}"
-        ])
-
-        out = subprocess.check_output(cmd, timeout=TIMEOUT + 5, stderr=subprocess.DEVNULL)
-        parts = out.decode().strip().split()
-
-        if len(parts) < 3:
-            return None
+limiters = LimiterRegistry()
+landing_assigner = LandingAssigner(LandingCache())
 
-        tc, ta, code = parts[0], parts[1], parts[2]
+# 多域名评分时每个 IP 的域名数；单域名评分为 None
+DOMAIN_COUNT = len(TRACE_DOMAINS) if SCORING_STRATEGY == "multi" else None
 
-        if code in ["000", "0"]:
-            return None
 
-        latency = int((float(tc) + float(ta)) * 1000)
+def _proxy_args(proxy):
+    """curl 代理参数"""
+    if not proxy:
+        return []
 
-        if latency > LATENCY_LIMIT:
-            return None
+    if proxy.type in ['socks5', 'socks4']:
+        # SOCKS5 代理
+        if proxy.api_result and proxy.api_result.get("username"):
+            username = proxy.api_result["username"]
+            password = proxy.api_result["password"]
+            proxy_url = f"{username}:{password}@{proxy.host}:{proxy.port}"
+        else:
+            proxy_url = f"{proxy.host}:{proxy.port}"
+        return ["--socks5", proxy_url]
+
+    # HTTPS/HTTP 代理
+    return ["-x", proxy.get_proxy_url("http")]
+
+
+def _curl_cmd(ip, proxy, domain, port):
+    """
+    一次 curl 同时拿到延迟和响应头:
+    -D - 把响应头写到 stdout，-w 在末尾追加一行计时信息
+    """
+    return [
+        "curl", "-k", "-s", "-o", "/dev/null", "-D", "-",
+        *_proxy_args(proxy),
+        "-w", "\n%{time_connect} %{time_appconnect} %{http_code}",
+        "--http1.1",
+        "--connect-timeout", str(CONNECT_TIMEOUT + 2),
+        "--max-time", str(TIMEOUT + 3),
+        "--resolve", f"{domain}:{port}:{ip}",
+        f"https://{domain}:{port}"
+    ]
+
+
+def _parse_curl_output(out, ip, proxy, domain, port):
+    head, _, stats = out.decode(errors="ignore").rstrip().rpartition("\n")
+    parts = stats.split()
+
+    if len(parts) < 3:
+        return None
 
-        # 获取 CF-Ray → colo
-        hdr_cmd = ["curl", "-k", "-sI"]
-
-        if proxy:
-            # ⚠️ 优化：同样使用 get_proxy_url() 方法
-            if proxy.type in ['socks5', 'socks4']:
-                if proxy.api_result and proxy.api_result.get("username"):
-                    username = proxy.api_result["username"]
-                    password = proxy.api_result["password"]
-                    proxy_url = f"{username}:{password}@{proxy.host}:{proxy.port}"
-                else:
-                    proxy_url = f"{proxy.host}:{proxy.port}"
-                hdr_cmd.extend(["--socks5", proxy_url])
-            else:
-                proxy_url = proxy.get_proxy_url("http")
-                hdr_cmd.extend(["-x", proxy_url])
-
-        hdr_cmd.extend([
-            "--connect-timeout", str(CONNECT_TIMEOUT + 2),
-            "--max-time", str(TIMEOUT + 3),
-            "--resolve", f"{TRACE_DOMAIN}:443:{ip}",
-            f"https://{TRACE_DOMAIN}"
-        ])
-
-        hdr = subprocess.check_output(
-            hdr_cmd,
-            timeout=TIMEOUT + 3,
-            stderr=subprocess.DEVNULL
-        ).decode(errors="ignore").lower()
-
-        ray = None
-        for line in hdr.splitlines():
-            if line.startswith("cf-ray"):
-                ray = line.split(":", 1)[1].strip()
-                break
+    tc, ta, code = parts[0], parts[1], parts[2]
 
-        if not ray:
-            return None
-
-        colo = ray.split("-")[-1].upper()
-        region = COLO_MAP.get(colo, "UNMAPPED")
+    if code in ["000", "0"]:
+        return None
 
-        return {
-            "ip": str(ip),
-            "domain": TRACE_DOMAIN,
-            "colo": colo,
-            "region": region,
-            "latency": latency,
-            "proxy": f"{proxy.host}:{proxy.port}({proxy.type})" if proxy else "direct"
-        }
+    latency = int((float(tc) + float(ta)) * 1000)
 
-    except subprocess.TimeoutExpired:
+    if latency > LATENCY_LIMIT:
         return None
-    except Exception as e:
-        logging.debug(f"测试失败: {ip} - {e}")
+
+    # CF-Ray → colo
+    ray = None
+    for line in head.lower().splitlines():
+        if line.startswith("cf-ray"):
+            ray = line.split(":", 1)[1].strip()
+            break
+
+    if not ray:
         return None
 
+    colo = ray.split("-")[-1].upper()
+    region = COLO_MAP.get(colo, "UNMAPPED")
+
+    return {
+        "ip": str(ip),
+        "port": port,
+        "domain": domain,
+        "colo": colo,
+        "region": region,
+        "latency": latency,
+        "proxy": f"{proxy.host}:{proxy.port}({proxy.type})" if proxy else "direct"
+    }
+
+
+def _wait_curl(proc, deadline, cancel=None):
+    """等待 curl 结束；超时抛 TimeoutExpired，被取消时杀掉进程并返回 None"""
+    if cancel is None:
+        out, _ = proc.communicate(timeout=max(0.1, deadline - time.monotonic()))
+        return out
+
+    while True:
+        if cancel.is_set():
+            proc.kill()
+            proc.communicate()
+            return None
+        remaining = deadline - time.monotonic()
+        try:
+            out, _ = proc.communicate(timeout=max(0.05, min(0.2, remaining)))
+            return out
+        except subprocess.TimeoutExpired:
+            if remaining <= 0:
+                raise
+
+
+def curl_test_many(ip, proxy, targets, cancel=None):
+    """
+    对同一 IP 并发测试多个 (domain, port) 目标
+
+    每个目标一个 curl 进程，全部同时启动，总耗时约等于最慢的那个。
+    cancel (threading.Event) 置位后立即杀掉尚未结束的 curl 进程。
+    Returns:
+        list: 与 targets 一一对应的结果（失败为 None）
+    """
+    procs = []
+    for domain, port in targets:
+        try:
+            procs.append(subprocess.Popen(
+                _curl_cmd(ip, proxy, domain, port),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            ))
+        except OSError as e:
+            logging.debug(f"curl 启动失败: {ip} - {e}")
+            procs.append(None)
+
+    deadline = time.monotonic() + TIMEOUT + 5
+    results = []
+
+    for proc, (domain, port) in zip(procs, targets):
+        if proc is None:
+            results.append(None)
+            continue
+        try:
+            out = _wait_curl(proc, deadline, cancel)
+            results.append(_parse_curl_output(out, ip, proxy, domain, port) if out else None)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            results.append(None)
+        except Exception as e:
+            logging.debug(f"测试失败: {ip} - {e}")
+            results.append(None)
+
+    return results
+
 
-def test_ip(ip, proxy=None):
-    """现在只测一个域名"""
-    result = curl_test(ip, proxy)
+def curl_test(ip, proxy=None, port=PROBE_PORT, domain=TRACE_DOMAIN):
+    """单域名测试连通性 + 延迟 + colo"""
+    return curl_test_many(ip, proxy, [(domain, port)])[0]
+
+
+def test_ip(ip, proxy=None, cancel=None):
+    """
+    single: 只测 TRACE_DOMAIN
+    multi: 并发测试 TRACE_DOMAINS 中的全部域名（多域名稳定性评分）
+    """
+    if SCORING_STRATEGY == "multi":
+        targets = [(domain, PROBE_PORT) for domain in TRACE_DOMAINS.values()]
+        records = []
+        for view, r in zip(TRACE_DOMAINS, curl_test_many(ip, proxy, targets, cancel)):
+            if r:
+                r["view"] = view
+                records.append(r)
+        return records
+
+    result = curl_test_many(ip, proxy, [(TRACE_DOMAIN, PROBE_PORT)], cancel)[0]
     if result:
         return [result]
     return []
 
 
-def weighted_random_ips(cidrs, total):
+def detect_direct_region(ips, attempts=3):
+    """用少量直连探测确定本机直连落地的地区（用于判断直连能否作为对冲路径）"""
+    for ip in ips[:attempts]:
+        result = curl_test(ip)
+        if result:
+            logging.info(f"直连落地: {result['colo']} → {result['region']}")
+            return result["region"]
+    logging.info("直连落地地区未知")
+    return None
+
+
+def sweep_ports(nodes, stop_at=None):
+    """
+    对短名单节点探测全部 HTTPS_PORTS（直连，与直连补充共享同一个并发上限）
+
+    Returns:
+        dict: ip -> {"port": 延迟最低的已验证端口（无则 None）, "ports": {已探测端口: 延迟或 None}}
+        时间不足、一个端口都没探测到的 IP 不在结果中
+    """
+    ips = list(dict.fromkeys(n["ip"] for n in nodes))
+    port_latency = {ip: {} for ip in ips}
+
+    logging.info(f"端口探测: {len(ips)} 个IP × {len(HTTPS_PORTS)} 个端口...")
+
+    def probe(task):
+        return curl_test(task[0], None, task[1])
+
+    tasks = ((ip, port) for ip in ips for port in HTTPS_PORTS)
+    results = stream_map(
+        probe, tasks,
+        max_workers=PORT_SWEEP_WORKERS,
+        limiter=limiters.get("direct", "direct")
+    )
+    for (ip, port), result in results:
+        port_latency[ip][port] = result["latency"] if result else None
+        if stop_at is not None and time.monotonic() >= stop_at:
+            logging.info("  ⏱ 时间预算不足,提前结束端口探测")
+            break
+
+    sweep = {}
+    for ip, latencies in port_latency.items():
+        if not latencies:
+            continue            # 时间不足未探测到，视为未探测
+        ok_ports = [p for p in HTTPS_PORTS if latencies.get(p) is not None]
+        sweep[ip] = {
+            "port": min(ok_ports, key=lambda p: latencies[p]) if ok_ports else None,
+            "ports": {str(p): latencies[p] for p in HTTPS_PORTS if p in latencies},
+        }
+
+    working = sum(1 for s in sweep.values() if s["port"] is not None)
+    verified = sum(
+        1 for ip in sweep for lat in sweep[ip]["ports"].values() if lat is not None
+    )
+    logging.info(f"  ✓ 端口探测完成: {working}/{len(ips)} 个IP有可用端口,共 {verified} 个端口验证通过")
+    return sweep
+
+
+def _port_dead(swept):
+    """全部端口（含 443）都探测失败"""
+    return swept is not None and swept["port"] is None and len(swept["ports"]) == len(HTTPS_PORTS)
+
+
+def sweep_region_top(ranker, regions, stop_at=None):
+    """
+    选出各地区的输出节点并做端口探测
+
+    全部端口探测失败的节点从候选中剔除，再对该地区余下的候选重新 select_diverse
+    补齐，补进来的节点同样先做端口探测，直到各地区补满、候选用完或到 stop_at。
+
+    Returns:
+        (region_top, sweep)，sweep 同 sweep_ports 的返回值，包含每一轮的结果
+    """
+    sweep, tried = {}, set()
+    while True:
+        region_top = {
+            region: select_diverse(
+                [n for n in ranker.top(region) if not _port_dead(sweep.get(n["ip"]))],
+                MAX_OUTPUT_PER_REGION
+            )
+            for region in regions
+        }
+        fresh = [n for nodes in region_top.values() for n in nodes if n["ip"] not in tried]
+        if not fresh or (stop_at is not None and time.monotonic() >= stop_at):
+            return region_top, sweep
+        if tried:
+            logging.info(f"  补齐: {len(fresh)} 个替补节点待端口探测")
+        tried.update(n["ip"] for n in fresh)
+        sweep.update(sweep_ports(fresh, stop_at))
+
+
+def apply_port_sweep(nodes, sweep):
+    """
+    把端口探测结果写入节点，返回保留的节点
+
+    全部端口（含 443）都探测失败的节点被剔除；未探测的节点 ports 为空，
+    保证每个节点都有 ports 字段
+    """
+    kept = []
+    for n in nodes:
+        swept = sweep.get(n["ip"])
+        if swept is None:
+            n.setdefault("ports", {})
+        elif _port_dead(swept):
+            continue
+        else:
+            if swept["port"] is not None:
+                n["port"] = swept["port"]
+            n["ports"] = swept["ports"]
+        kept.append(n)
+    return kept
+
+
+def weighted_random_ips(cidrs, total, rng=random):
     pools = []
     for c in cidrs:
         net = ipaddress.ip_network(c)
@@ -157,110 +337,118 @@ def weighted_random_ips(cidrs, total):
         cnt = max(1, int(total * weight / total_weight))
         hosts = list(net.hosts())
         if hosts:
-            result.extend(random.sample(hosts, min(cnt, len(hosts))))
+            result.extend(rng.sample(hosts, min(cnt, len(hosts))))
 
-    random.shuffle(result)
+    rng.shuffle(result)
     return result[:total]
 
 
-def score_ip(latencies):
-    """单域名后 latencies 长度最多为1"""
-    if not latencies:
-        return 0
-
-    lat = latencies[0]
-    score = 1 / (1 + lat / 200)
-    score = round(score, 4)
-    return score
-
-
-def aggregate_nodes(raw):
-    ip_map = defaultdict(list)
-    for r in raw:
-        ip_map[r["ip"]].append(r)
-
-    nodes = []
-    for ip, items in ip_map.items():
-        latencies = [x["latency"] for x in items]
-        score = score_ip(latencies)
-        if score <= 0:
-            continue
-
-        best = min(items, key=lambda x: x["latency"])
-        nodes.append({
-            "ip": ip,
-            "port": random.choice(HTTPS_PORTS),
-            "region": best["region"],
-            "colo": best["colo"],
-            "latencies": latencies,
-            "score": score
-        })
-
-    return nodes
-
+def scan_region(region, ips, proxies, on_result=None, direct_region=None,
+                stop_at=None, deadline=None, on_probe=None, prior_results=None):
+    """
+    扫描单个地区
 
-def scan_region(region, ips, proxies):
+    on_result: 每得到一条有效结果时回调（用于流式排名）
+    on_probe: 每完成一次探测时回调 (ip, results)，含失败（用于写断点）
+    prior_results: 断点中已有的结果，计入节点数但不再回调 on_result
+    direct_region: 直连落地地区，与 region 相同时直连可作为对冲路径
+    stop_at: 截止时刻（time.monotonic()），到点停止派发新的探测
+    deadline: Deadline，扫描结束后反馈实测探测吞吐
+    """
     logging.info(f"\n{'='*60}")
     logging.info(f"开始扫描地区: {region}")
     logging.info(f"{'='*60}")
 
-    raw_results = []
+    raw_results = list(prior_results or [])
+    stats = RegionAccumulator(DOMAIN_COUNT)
+    stats.add_many(raw_results)
     MIN_EXPECTED_NODES = 8
+    # 直连补充一旦触发就补到候选池的规模，select_diverse 才有挑选余地
+    SUPPLEMENT_TARGET = MAX_OUTPUT_PER_REGION * DIVERSITY_POOL_FACTOR
 
-    if proxies:
-        logging.info(f"使用 {len(proxies)} 个代理进行扫描...")
-        ips_per_proxy = max(1, len(ips) // len(proxies))
+    started = time.monotonic()
 
-        for i, proxy in enumerate(proxies):
-            proxy_ips = ips[i*ips_per_proxy:(i+1)*ips_per_proxy]
-            if not proxy_ips:
-                continue
+    def collect(ip, batch):
+        if on_probe:
+            on_probe(ip, batch)
+        raw_results.extend(batch)
+        stats.add_probe(batch)
+        if on_result:
+            for r in batch:
+                on_result(r)
 
-            # ⚠️ 修改：显示代理信息时标注是否需要认证
-            auth_info = ""
-            if proxy.api_result and proxy.api_result.get("username"):
-                auth_info = "[AUTH]"
-            proxy_info = f"{proxy.host}:{proxy.port}({proxy.type}){auth_info}"
-            logging.info(f"  → 通过代理 {proxy_info} 测试 {len(proxy_ips)} 个IP...")
+    def out_of_time():
+        return stop_at is not None and time.monotonic() >= stop_at
+
+    if proxies:
+        # 每次探测由代理池按实时成功率 / 延迟 / 在途数挑选代理，不再按代理平均切分 IP
+        pool = ProxyPool(proxies, limiter_of=lambda p: limiters.get(path_label(p), "proxy"))
+        logging.info(f"使用 {len(proxies)} 个代理进行扫描 (代理池,在途上限 {pool.max_in_flight})...")
+
+        prober = None
+
+        def probe(ip, proxy):
+            return test_ip(ip, proxy=proxy), proxy
+
+        if HEDGE_ENABLED:
+            # 对冲路径占用自己在代理池中的名额，直连对冲反馈给直连的限流器
+            prober = HedgedProber(
+                test_ip, proxies,
+                allow_direct=(direct_region == region),
+                max_workers=pool.max_in_flight * 2,
+                pool=pool,
+                limiter_of=lambda p: limiters.get(path_label(p), "proxy" if p else "direct")
+            )
+            probe = prober.run
+
+        for ip, batch in stream_map(partial(pool.run, probe), ips, max_workers=pool.max_in_flight):
+            collect(ip, batch)
+            if out_of_time():
+                logging.info("  ⏱ 地区时间预算用尽,停止代理扫描")
+                break
+        pool.close()
 
-            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = [executor.submit(test_ip, ip, proxy) for ip in proxy_ips]
+        for line in pool.summary():
+            logging.info(f"  → {line}")
 
-                for future in as_completed(futures):
-                    try:
-                        batch = future.result(timeout=TIMEOUT + 5)
-                        raw_results.extend(batch)
-                    except:
-                        pass
+        if prober:
+            prober.close()
+            logging.info(f"  {prober.summary()}")
 
         logging.info(f"  ✓ 代理扫描收集: {len(raw_results)} 条结果")
 
-    current_nodes = len(aggregate_nodes(raw_results))
+    current_nodes = stats.node_count
     
-    if current_nodes < MIN_EXPECTED_NODES:
-        needed_nodes = MIN_EXPECTED_NODES - current_nodes
-        supplement_count = min(len(ips) // 2, needed_nodes * 5)
-        
-        logging.info(f"⚠ 当前有效节点 {current_nodes} 个,目标 {MIN_EXPECTED_NODES} 个")
+    if current_nodes < MIN_EXPECTED_NODES and out_of_time():
+        logging.info(f"  ⏱ 地区时间预算用尽,跳过直连补充 (当前 {current_nodes} 个节点)")
+    elif current_nodes < MIN_EXPECTED_NODES:
+        needed_nodes = SUPPLEMENT_TARGET - current_nodes
+        supplement_count = min(len(ips), needed_nodes * 5)
+
+        logging.info(f"⚠ 当前有效节点 {current_nodes} 个,不足 {MIN_EXPECTED_NODES} 个,直连补充到 {SUPPLEMENT_TARGET} 个")
         logging.info(f"  使用直连补充测试 {supplement_count} 个IP...")
 
         remaining_ips = ips[:supplement_count]
+        cancel = threading.Event()
+        direct_probe = partial(test_ip, proxy=None, cancel=cancel)
+
+        direct_limiter = limiters.get("direct", "direct")
+        for ip, batch in stream_map(direct_probe, remaining_ips, cancel=cancel, limiter=direct_limiter):
+            collect(ip, batch)
+            if stats.node_count >= SUPPLEMENT_TARGET:
+                logging.info("  ✓ 已达到候选池规模,停止直连补充")
+                break
+            if out_of_time():
+                logging.info("  ⏱ 地区时间预算用尽,停止直连补充")
+                break
 
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = [executor.submit(test_ip, ip, None) for ip in remaining_ips]
-
-            for future in as_completed(futures):
-                try:
-                    batch = future.result(timeout=TIMEOUT + 5)
-                    raw_results.extend(batch)
-                except:
-                    pass
-
-        final_nodes = len(aggregate_nodes(raw_results))
-        logging.info(f"  ✓ 直连补充后有效节点: {final_nodes} 个")
+        logging.info(f"  ✓ 直连补充后有效节点: {stats.node_count} 个")
     else:
         logging.info(f"  ✓ 代理结果充足 ({current_nodes} 个节点),跳过直连补充")
 
+    if deadline:
+        deadline.observe_probes(stats.probes, time.monotonic() - started)
+
     logging.info(f"✓ {region}: 总计收集 {len(raw_results)} 条测试结果\n")
     return raw_results
 
@@ -283,13 +471,50 @@ def calculate_test_count(available_count, target_count):
     return max(test_count, target_count)
 
 
-def get_proxies(region):
-    all_proxies = []
+def validate_proxies(proxies, stop_at=None):
+    """按 PROXY_VALIDATOR 检测一批代理，yield (proxy, result)；到 stop_at 后不再开始新的检测"""
+    if PROXY_VALIDATOR in ("local", "local_first"):
+        results = validate_many(proxies, stop_at=stop_at)
+        passed = sum(1 for _, r in results if r["success"])
+        logging.info(f"  本地检测: {passed}/{len(results)} 个代理通过")
+        if passed or PROXY_VALIDATOR == "local":
+            yield from results
+            return
+        logging.warning("  本地检测无代理通过,改用检测 API")
+
+    if stop_at is not None:
+        proxies = takewhile(lambda _: time.monotonic() < stop_at, proxies)
+    yield from stream_map(
+        check_proxy_with_api, proxies,
+        limiter=limiters.get("check_api", "check_api"),
+        is_ok=lambda r: r["success"]
+    )
+
+
+def check_proxy(proxy):
+    """单个代理检测，遵循 PROXY_VALIDATOR"""
+    if PROXY_VALIDATOR == "api":
+        return check_proxy_with_api(proxy)
+    result = check_proxy_local(proxy)
+    if result["success"] or PROXY_VALIDATOR == "local":
+        return result
+    return check_proxy_with_api(proxy)
+
 
-    all_proxies.extend(fetch_proxifly_proxies(region, REGION_TO_COUNTRY_CODE))
-    all_proxies.extend(fetch_proxydaily_proxies(region, REGION_TO_COUNTRY_CODE))
-    all_proxies.extend(fetch_tomcat1235_proxies(region))
-    all_proxies.extend(fetch_monosans_socks5_proxies(region))
+def get_proxies(region, stop_at=None):
+    """
+    获取、筛选并检测 region 的代理，返回按延迟排好的可用代理
+
+    stop_at: 截止时刻（time.monotonic()）。数据源等待、存活预检、检测与落地探测
+    到点后不再开始新的工作，只用已经得到的结果。
+    """
+    source_deadline = PROXY_SOURCE_DEADLINE
+    if stop_at is not None:
+        source_deadline = max(0.0, min(source_deadline, stop_at - time.monotonic()))
+    fetched, _ = fetch_all_sources(region, REGION_TO_COUNTRY_CODE, deadline=source_deadline)
+    all_proxies = dedupe_proxies(fetched)
+    if len(all_proxies) < len(fetched):
+        logging.info(f"{region} 跨数据源去重: {len(fetched)} → {len(all_proxies)} 个代理")
 
     if not all_proxies:
         logging.warning(f"⚠ {region} 未获取到任何代理")
@@ -298,13 +523,13 @@ def get_proxies(region):
     target_country_code = REGION_TO_COUNTRY_CODE.get(region, region.upper())
     
     unknown_proxies = [p for p in all_proxies if p.country_code == "UNKNOWN"]
-    if unknown_proxies:
+    if unknown_proxies and not (stop_at is not None and time.monotonic() >= stop_at):
         logging.info(f"{region} 发现 {len(unknown_proxies)} 个未知国家码代理,进行API检测...")
         
         test_count = min(5, len(unknown_proxies))
         with ThreadPoolExecutor(max_workers=5) as executor:
             future_to_proxy = {
-                executor.submit(check_proxy_with_api, p): p 
+                executor.submit(check_proxy, p): p 
                 for p in unknown_proxies[:test_count]
             }
             
@@ -359,6 +584,26 @@ def get_proxies(region):
     if not filtered_proxies:
         return []
 
+    if LIVENESS_CHECK:
+        # 开启协议探测时 http / socks4 代理也参加预检，握手不符时探测实际协议
+        candidates = filtered_proxies if PROTOCOL_DETECT else [
+            p for p in filtered_proxies if p.type in ("socks5", "https")
+        ]
+        filtered_proxies = filter_alive(candidates, stop_at=stop_at)
+        logging.info(f"{region} 存活预检: {len(filtered_proxies)}/{len(candidates)} 个代理有响应")
+        if not filtered_proxies:
+            logging.warning(f"⚠ {region} 无代理通过存活预检")
+            return []
+    elif PROTOCOL_DETECT:
+        unlabeled = [p for p in filtered_proxies if p.type not in ("socks5", "https")]
+        detected = detect_protocols(unlabeled, stop_at=stop_at)
+        logging.info(f"{region} 协议探测: {len(detected)}/{len(unlabeled)} 个 http/socks4 代理可用于扫描")
+        filtered_proxies = [p for p in filtered_proxies if p.type in ("socks5", "https")]
+
+    if PROTOCOL_DETECT:
+        # 探测改写类型后可能与已有条目重复
+        filtered_proxies = dedupe_proxies(filtered_proxies)
+
     socks5_proxies = [p for p in filtered_proxies if p.type == "socks5"]
     https_proxies = [p for p in filtered_proxies if p.type == "https"]
 
@@ -378,22 +623,22 @@ def get_proxies(region):
     logging.info(f"  └─ SOCKS5: {min(socks5_test_count, len(socks5_proxies))} 个, HTTPS: {min(https_test_count, len(https_proxies))} 个")
 
     candidate_proxies = []
+    known_colos = {}
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_proxy = {executor.submit(check_proxy_with_api, p): p for p in test_proxies}
-        for future in as_completed(future_to_proxy):
-            proxy = future_to_proxy[future]
-            try:
-                test_result = future.result()
-                if test_result["success"]:
-                    candidate_proxies.append(proxy)
-            except Exception:
-                pass
+    for proxy, test_result in validate_proxies(test_proxies, stop_at):
+        if test_result["success"]:
+            candidate_proxies.append(proxy)
+            if test_result.get("colo"):
+                known_colos[id(proxy)] = test_result["colo"]
 
     if not candidate_proxies:
         logging.warning(f"⚠ {region} 无可用代理通过测试")
         return []
 
+    if COLO_CLASSIFY:
+        # 按 CF-Ray 的实际落地 colo 分配: 落地在其他地区的代理转给该地区，不占用本地区的探测预算
+        candidate_proxies = landing_assigner.assign(region, candidate_proxies, known_colos, stop_at)
+
     socks5_list = [p for p in candidate_proxies if p.type == "socks5"]
     https_list = [p for p in candidate_proxies if p.type == "https"]
 
@@ -461,7 +706,7 @@ def load_html_template():
         return None
 
 
-def generate_html(all_nodes, region_results, region_proxies):
+def generate_html(all_nodes, region_results, region_proxies, region_top):
     """生成HTML页面"""
     template = load_html_template()
     if not template:
@@ -477,8 +722,10 @@ def generate_html(all_nodes, region_results, region_proxies):
         region_name = REGION_CONFIG.get(region, {}).get("name", region)
         region_flag = REGION_CONFIG.get(region, {}).get("flag", "")
 
+        top_nodes = region_top.get(region, [])
+
         ip_items_html = []
-        for node in nodes[:MAX_OUTPUT_PER_REGION]:
+        for node in top_nodes:
             min_latency = min(node['latencies']) if node['latencies'] else "N/A"
             ip_html = f"""
             <div class="ip-item">
@@ -527,7 +774,7 @@ def generate_html(all_nodes, region_results, region_proxies):
                 <span class="region-count">{len(nodes)} 节点</span>
             </div>
             <div class="region-body">
-                <div class="section-title">📡 优选IP ({len(nodes[:MAX_OUTPUT_PER_REGION])})</div>
+                <div class="section-title">📡 优选IP ({len(top_nodes)})</div>
                 <div class="ip-list">
                     {''.join(ip_items_html)}
                 </div>
@@ -564,62 +811,189 @@ def generate_html(all_nodes, region_results, region_proxies):
     logging.info(f"  - 共 {total_proxies} 个代理节点")
 
 
-def main():
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    os.makedirs(DATA_DIR, exist_ok=True)
-
-    logging.info(f"\n{'#'*70}")
-    logging.info("Cloudflare IP 优选扫描器 V2.1 单域名版")
-    logging.info(f"测试域名:{TRACE_DOMAIN}")
-    logging.info("代理检测:API")
-    logging.info(f"{'#'*70}\n")
-
-    if not run_internal_tests():
-        logging.error("内部自检未通过,程序退出")
-        return
-
-    logging.info("\n" + "="*60)
-    logging.info("开始正式扫描...")
-    logging.info("="*60)
-
-    logging.info("\n获取 Cloudflare IP 范围...")
-    cidrs = fetch_cf_ipv4_cidrs()
-    if not cidrs:
-        logging.error("无法获取 Cloudflare IP 段,程序退出")
-        return
-
-    total_ips = sum(cfg["sample"] for cfg in REGION_CONFIG.values())
-    logging.info(f"生成 {total_ips} 个测试 IP...\n")
-    all_test_ips = weighted_random_ips(cidrs, total_ips)
-
-    all_results = []
-    region_results = {}
-    region_proxies = {}
-
+def scan_all(cidrs, ranker, region_proxies, deadline=None, checkpoint=None, resume=None,
+             shard=None, rng=random):
+    """
+    按地区依次获取代理并扫描；有时间预算时为每个地区分配截止时刻
+
+    checkpoint: Checkpoint，逐条追加写入采样计划、代理与探测结果
+    resume: 从断点恢复的 ScanState，跳过已完成的地区与已探测的 IP
+    shard: (index, count)，分片模式下只扫描各地区 IP 计划中分给本分片的条目；
+        IP 计划仍按全部地区生成
+    rng: 生成 IP 计划的随机源，分片之间用相同种子保证计划一致
+
+    Returns:
+        bool: 计划中的每个地区都完整扫描（没有因时间预算被跳过或截短）。
+        被截短的地区不标记完成，--resume 时继续探测其余 IP
+    """
+    if resume:
+        all_test_ips = resume.plan["ips"]
+        direct_region = resume.plan["direct_region"]
+        for region, results in resume.results.items():
+            ranker.add_many(region, results)
+        probed = sum(len(ips) for ips in resume.probed.values())
+        logging.info(f"从断点恢复: 已完成 {len(resume.done)} 个地区,已探测 {probed} 个IP\n")
+    else:
+        total_ips = sum(cfg["sample"] for cfg in REGION_CONFIG.values())
+        logging.info(f"生成 {total_ips} 个测试 IP...\n")
+        all_test_ips = [str(ip) for ip in weighted_random_ips(cidrs, total_ips, rng)]
+        direct_region = detect_direct_region(all_test_ips) if HEDGE_ENABLED else None
+        if checkpoint:
+            checkpoint.start(all_test_ips, direct_region)
+
+    plan = []
     ip_offset = 0
     for region, config in REGION_CONFIG.items():
         sample_size = config["sample"]
         region_ips = all_test_ips[ip_offset:ip_offset + sample_size]
+        if shard:
+            region_ips = shard_plan(region, region_ips, *shard)
+        plan.append((region, region_ips))
         ip_offset += sample_size
 
-        proxies = get_proxies(region)
-        region_proxies[region] = proxies
+    finished = True
+    for index, (region, region_ips) in enumerate(plan):
+        if resume and region in resume.done:
+            region_proxies[region] = resume.proxies.get(region, [])
+            logging.info(f"↷ {region}: 断点中已完成,跳过 ({ranker.node_count(region)} 个节点)")
+            continue
 
-        raw = scan_region(region, region_ips, proxies)
-        nodes = aggregate_nodes(raw)
+        stop_at = None
+        if deadline:
+            if deadline.expired():
+                logging.warning(f"⏱ 时间预算用尽,跳过 {region} 及之后的地区")
+                finished = False
+                break
+            stop_at = deadline.region_stop_at(len(plan) - index)
+
+        prior_results = []
+        if resume and region in resume.proxies:
+            proxies = resume.proxies[region]
+            probed = resume.region_probed(region)
+            prior_results = resume.region_results(region)
+            region_ips = [ip for ip in region_ips if ip not in probed]
+            logging.info(f"↻ {region}: 复用断点中的 {len(proxies)} 个代理,剩余 {len(region_ips)} 个IP待测")
+        else:
+            fetch_started = time.monotonic()
+            proxies = get_proxies(region, stop_at)
+            if COLO_CLASSIFY:
+                # get_proxies 提前返回（本地区无代理可用）时，落地本地区的暂存代理仍可使用
+                proxies = dedupe_proxies(proxies + landing_assigner.take(region))
+            if checkpoint:
+                checkpoint.record_proxies(region, proxies)
+            if deadline:
+                deadline.observe_proxy_cost(time.monotonic() - fetch_started)
+        region_proxies[region] = proxies
 
-        region_results[region] = nodes
-        all_results.extend(raw)
+        trimmed = False
+        if deadline:
+            affordable = deadline.affordable_probes(stop_at)
+            if affordable is not None and affordable < len(region_ips):
+                affordable = max(affordable, DEADLINE_MIN_REGION_PROBES)
+                logging.info(f"⏱ {region}: 按当前吞吐只安排 {affordable}/{len(region_ips)} 个IP")
+                trimmed = affordable < len(region_ips)
+                region_ips = region_ips[:affordable]
+
+        scan_region(
+            region, region_ips, proxies,
+            on_result=partial(ranker.add, region),
+            direct_region=direct_region,
+            stop_at=stop_at,
+            deadline=deadline,
+            on_probe=partial(checkpoint.record_probe, region) if checkpoint else None,
+            prior_results=prior_results
+        )
+        if trimmed or (stop_at is not None and time.monotonic() >= stop_at):
+            finished = False
+        elif checkpoint:
+            checkpoint.mark_done(region)
 
         logging.info(f"{'='*60}")
-        logging.info(f"✓ {region}: 发现 {len(nodes)} 个有效节点")
+        logging.info(f"✓ {region}: 发现 {ranker.node_count(region)} 个有效节点")
+        leader = ranker.top_global()[:1]
+        if leader:
+            logging.info(f"  当前全局最佳: {leader[0]['ip']} ({leader[0]['region']}) score={leader[0]['score']:.4f}")
         logging.info(f"{'='*60}\n")
 
         time.sleep(1)
 
-    all_nodes = aggregate_nodes(all_results)
-    all_nodes.sort(key=lambda x: x["score"], reverse=True)
+    if deadline:
+        top_up_regions(cidrs, ranker, region_proxies, deadline, checkpoint)
+    return finished
+
+
+def absorb_parked(region_proxies, checkpoint=None):
+    """把暂存的、落地在已扫描地区的代理并入该地区的代理列表（补扫与写出前调用）"""
+    for region in region_proxies:
+        parked = landing_assigner.take(region)
+        if not parked:
+            continue
+        region_proxies[region] = dedupe_proxies(region_proxies[region] + parked)
+        logging.info(f"  {region}: 并入 {len(parked)} 个落地本地区的代理")
+        if checkpoint:
+            checkpoint.record_proxies(region, region_proxies[region])
+
+
+def top_up_regions(cidrs, ranker, region_proxies, deadline, checkpoint=None):
+    """时间预算有剩余时，用新采样的 IP 给节点不足的地区补扫"""
+    if COLO_CLASSIFY:
+        # 已扫描的地区在之后才出现落地到它的代理: 补扫时一起使用
+        absorb_parked(region_proxies, checkpoint)
+
+    short = [
+        r for r in region_proxies
+        if ranker.node_count(r) < MAX_OUTPUT_PER_REGION and region_proxies[r]
+    ]
+    if not short or deadline.expired():
+        return
 
+    logging.info(f"⏱ 剩余 {int(deadline.scan_remaining())}s,补扫节点不足的地区: {', '.join(short)}")
+    for index, region in enumerate(short):
+        if deadline.expired():
+            break
+        stop_at = deadline.region_stop_at(len(short) - index)
+        budget = deadline.affordable_probes(stop_at)
+        sample = REGION_CONFIG[region]["sample"] if budget is None else min(budget, REGION_CONFIG[region]["sample"])
+        if sample < DEADLINE_MIN_REGION_PROBES:
+            continue
+        ips = weighted_random_ips(cidrs, sample)
+        scan_region(
+            region, ips, region_proxies[region],
+            on_result=partial(ranker.add, region),
+            stop_at=stop_at,
+            deadline=deadline,
+            on_probe=partial(checkpoint.record_probe, region) if checkpoint else None
+        )
+
+
+def write_outputs(ranker, region_proxies, deadline=None, complete=True, concurrency=None):
+    """
+    排名、端口探测并写出全部结果文件
+
+    concurrency: 写入 meta 的并发统计，缺省为本进程的限流器快照（合并分片时传入各分片的快照）
+    """
+    if concurrency is None:
+        concurrency = limiters.snapshot()
+    region_results = {region: ranker.region_nodes(region) for region in region_proxies}
+    sweep = {}
+    if PORT_SWEEP_ENABLED and complete:
+        stop_at = None
+        if deadline:
+            stop_at = time.monotonic() + max(0.0, deadline.remaining() - DEADLINE_OUTPUT_RESERVE / 4)
+        region_top, sweep = sweep_region_top(ranker, region_results, stop_at)
+    else:
+        region_top = {
+            region: select_diverse(ranker.top(region), MAX_OUTPUT_PER_REGION)
+            for region in region_results
+        }
+    all_nodes = apply_port_sweep(top_k_nodes(ranker.all_nodes()), sweep)
+    json_nodes = apply_port_sweep(select_diverse(
+        [n for n in ranker.top_global() if not _port_dead(sweep.get(n["ip"]))], MAX_JSON_NODES
+    ), sweep)
+    region_top = {region: apply_port_sweep(nodes, sweep) for region, nodes in region_top.items()}
+    dead = sum(1 for s in sweep.values() if _port_dead(s))
+    if dead:
+        logging.info(f"  剔除 {dead} 个全部端口探测失败的节点")
     logging.info(f"\n{'='*60}")
     logging.info(f"总计发现 {len(all_nodes)} 个节点")
     logging.info(f"{'='*60}\n")
@@ -628,16 +1002,17 @@ def main():
     with open(f"{OUTPUT_DIR}/ip_all.txt", "w", encoding="utf-8") as f:
         f.writelines(all_lines)
 
-    for region, nodes in region_results.items():
-        nodes.sort(key=lambda x: x["score"], reverse=True)
-        top_nodes = nodes[:MAX_OUTPUT_PER_REGION]
-
+    for region, top_nodes in region_top.items():
         with open(f"{OUTPUT_DIR}/ip_{region}.txt", "w", encoding="utf-8") as f:
             for n in top_nodes:
                 f.write(f'{n["ip"]}:{n["port"]}#{region}-score{n["score"]:.4f}\n')
 
         logging.info(f"{region}: 保存 {len(top_nodes)} 个节点")
 
+    logging.info("自适应并发上限:")
+    for name, snap in concurrency.items():
+        logging.info(f"  {name}: {snap['limit']} (峰值 {snap['peak']}, 完成 {snap['completed']}, 超时 {snap['timeouts']})")
+
     save_proxy_list(region_proxies)
 
     with open(f"{OUTPUT_DIR}/ip_candidates.json", "w", encoding="utf-8") as f:
@@ -646,15 +1021,20 @@ def main():
                 "generated_at": datetime.utcnow().isoformat() + "Z",
                 "total_nodes": len(all_nodes),
                 "regions": {r: len(nodes) for r, nodes in region_results.items()},
-                "version": "2.1-single-domain",
+                "version": "2.1-multi-domain" if SCORING_STRATEGY == "multi" else "2.1-single-domain",
                 "test_domain": TRACE_DOMAIN,
-                "proxy_check_method": "api",
+                "scoring": SCORING_STRATEGY,
+                "proxy_check_method": PROXY_VALIDATOR,
+                "port_sweep": PORT_SWEEP_ENABLED,
+                "concurrency": concurrency,
+                "complete": complete,
+                "deadline": deadline.summary() if deadline else None,
                 "total_proxies": sum(len(p) for p in region_proxies.values())
             },
-            "nodes": all_nodes[:200]
+            "nodes": json_nodes
         }, f, indent=2, ensure_ascii=False)
 
-    generate_html(all_nodes, region_results, region_proxies)
+    generate_html(all_nodes, region_results, region_proxies, region_top)
 
     print("\n" + "="*60)
     print("📊 扫描统计")
@@ -669,7 +1049,10 @@ def main():
     print(f"总代理数: {sum(len(p) for p in region_proxies.values())}")
     print("="*60)
 
-    logging.info("\n✅ 扫描完成!")
+    if complete:
+        logging.info("\n✅ 扫描完成!")
+    else:
+        logging.warning("\n⚠ 扫描被中断,已写出当前结果")
     logging.info(f"结果已保存到 {OUTPUT_DIR}/ 目录")
     logging.info("  - IP列表: ip_all.txt, ip_[REGION].txt")
     logging.info("  - 代理列表: proxy_all.txt, proxy_[REGION].txt")
@@ -677,5 +1060,237 @@ def main():
     logging.info("  - HTML页面: index.html")
 
 
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _new_ranker(cls=StreamingRanker):
+    return cls(
+        MAX_OUTPUT_PER_REGION * DIVERSITY_POOL_FACTOR,
+        MAX_JSON_NODES * DIVERSITY_POOL_FACTOR,
+        DOMAIN_COUNT
+    )
+
+
+def _prepare(budget_minutes=None, title=None, self_test=True):
+    """创建目录、安装 SIGTERM 处理、打印横幅、自检并获取 CF IP 段；失败时返回 None"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    os.makedirs(DATA_DIR, exist_ok=True)
+
+    # 被 SIGTERM（如 CI 超时取消）终止时也走中断流程，保证写出已有结果
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+
+    logging.info(f"\n{'#'*70}")
+    if SCORING_STRATEGY == "multi":
+        logging.info("Cloudflare IP 优选扫描器 V2.1 多域名版")
+        logging.info(f"测试域名:{', '.join(TRACE_DOMAINS.values())}")
+    else:
+        logging.info("Cloudflare IP 优选扫描器 V2.1 单域名版")
+        logging.info(f"测试域名:{TRACE_DOMAIN}")
+    logging.info(f"代理检测:{PROXY_VALIDATOR}")
+    if title:
+        logging.info(title)
+    if budget_minutes:
+        logging.info(f"时间预算:{budget_minutes} 分钟")
+    logging.info(f"{'#'*70}\n")
+
+    if self_test and not run_internal_tests():
+        logging.error("内部自检未通过,程序退出")
+        return None
+
+    logging.info("\n" + "="*60)
+    logging.info("开始正式扫描...")
+    logging.info("="*60)
+
+    logging.info("\n获取 Cloudflare IP 范围...")
+    cidrs = fetch_cf_ipv4_cidrs()
+    if not cidrs:
+        logging.error("无法获取 Cloudflare IP 段,程序退出")
+        return None
+    return cidrs
+
+
+def _new_deadline(budget_minutes, started_at=None):
+    """按进程启动时刻（或 started_at，墙钟）创建时间预算；无预算时返回 None"""
+    if not budget_minutes:
+        return None
+    spent = time.time() - (STARTED_AT if started_at is None else started_at)
+    return Deadline(budget_minutes * 60, spent=spent)
+
+
+def _run_scan(cidrs, ranker, deadline, checkpoint, resume, **scan_kwargs):
+    """
+    执行扫描，返回 (region_proxies, complete, finished)
+
+    complete: 没有被中断；finished: 另外每个计划中的地区都完整扫描，只有此时才能删除断点
+    """
+    region_proxies = {}
+    complete = True
+    finished = False
+
+    state = None
+    if resume:
+        state = checkpoint.load()
+        if state is None:
+            logging.warning("未找到可用的断点,开始新的扫描")
+
+    try:
+        finished = scan_all(cidrs, ranker, region_proxies, deadline, checkpoint, state, **scan_kwargs)
+    except KeyboardInterrupt:
+        logging.warning("⚠ 收到中断信号,停止扫描并写出已有结果...")
+        complete = False
+
+    return region_proxies, complete, finished
+
+
+def main(budget_minutes=None, resume=False, seed=None):
+    deadline = _new_deadline(budget_minutes)
+    cidrs = _prepare(budget_minutes)
+    if not cidrs:
+        return
+
+    ranker = _new_ranker()
+    checkpoint = Checkpoint()
+    region_proxies, complete, finished = _run_scan(
+        cidrs, ranker, deadline, checkpoint, resume,
+        rng=random.Random(seed) if seed is not None else random
+    )
+    if COLO_CLASSIFY:
+        absorb_parked(region_proxies, checkpoint)
+
+    write_outputs(ranker, region_proxies, deadline, complete)
+
+    if finished:
+        checkpoint.clear()
+    else:
+        checkpoint.close()
+        logging.info(f"断点已保存到 {CHECKPOINT_FILE},可使用 --resume 继续")
+
+
+def run_shard(index, count, budget_minutes=None, resume=False, seed=None, self_test=True, started_at=None):
+    """
+    运行单个分片: 扫描每个地区 IP 计划中经一致性哈希分给本分片的条目，写出部分结果文件
+
+    同一批分片必须使用相同的 seed，才能得到相同的 IP 计划。
+    started_at: 时间预算的起点（墙钟），本机多进程分片时传入父进程的启动时刻。
+    """
+    title = f"分片 {index}/{count}"
+    deadline = _new_deadline(budget_minutes, started_at)
+    cidrs = _prepare(budget_minutes, title, self_test)
+    if not cidrs:
+        return None
+
+    ranker = _new_ranker(RecordingRanker)
+    checkpoint = Checkpoint(os.path.join(DATA_DIR, f"checkpoint-shard-{index}-of-{count}.jsonl"))
+    region_proxies, complete, finished = _run_scan(
+        cidrs, ranker, deadline, checkpoint, resume,
+        shard=(index, count), rng=random.Random(seed)
+    )
+    if COLO_CLASSIFY:
+        absorb_parked(region_proxies, checkpoint)
+
+    path = write_partial(index, count, ranker, region_proxies, complete, seed, limiters.snapshot(), deadline)
+
+    if finished:
+        checkpoint.clear()
+    else:
+        checkpoint.close()
+    return path
+
+
+def run_local_shards(count, budget_minutes=None, resume=False, seed=None):
+    """用进程池在本机并行运行 count 个分片，全部结束后合并"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if not run_internal_tests():
+        logging.error("内部自检未通过,程序退出")
+        return
+
+    with ProcessPoolExecutor(max_workers=count) as pool:
+        futures = [
+            pool.submit(run_shard, i, count, budget_minutes, resume, seed, False, STARTED_AT)
+            for i in range(count)
+        ]
+        for i, future in enumerate(futures):
+            while True:
+                try:
+                    future.result()
+                    break
+                except KeyboardInterrupt:
+                    logging.warning("⚠ 收到中断信号,等待各分片写出部分结果...")
+                except Exception as e:
+                    logging.error(f"✗ 分片 {i}/{count} 失败: {e}")
+                    break
+
+    merge_shards(count)
+
+
+def merge_shards(count):
+    """读取 count 个分片的部分结果，重新聚合、排名并写出全部输出"""
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    partials = load_partials(count)
+    if not partials:
+        logging.error("没有可合并的分片结果")
+        return
+
+    ranker = _new_ranker()
+    region_proxies, concurrency, complete = merge_partials(partials, ranker)
+    logging.info(f"合并 {len(partials)}/{count} 个分片: {ranker.node_count()} 个节点")
+
+    write_outputs(ranker, region_proxies, complete=complete, concurrency=concurrency)
+
+
+def _default_seed():
+    # 同一天内各分片（如 CI matrix 中的多个 job）得到相同的 IP 计划
+    return int(datetime.utcnow().strftime("%Y%m%d"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Cloudflare IP 优选扫描器")
+    parser.add_argument(
+        "--budget", type=float, metavar="MINUTES",
+        help="总时间预算（分钟）: 按预算分配各地区扫描时间，并保证在预算内写出结果"
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help=f"从断点（{CHECKPOINT_FILE}）继续上次被中断的扫描"
+    )
+    parser.add_argument(
+        "--seed", type=int,
+        help="IP 计划的随机种子；分片模式下缺省为当天日期（UTC），保证各分片计划一致"
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--shard", metavar="i/N",
+        help="只运行第 i 个分片（0 <= i < N），写出部分结果文件供 --merge 合并"
+    )
+    mode.add_argument(
+        "--merge", type=int, metavar="N",
+        help="合并 N 个分片的部分结果并写出全部输出"
+    )
+    mode.add_argument(
+        "--local-shards", type=int, metavar="N",
+        help="在本机用 N 个进程并行运行全部分片，完成后自动合并"
+    )
+    args = parser.parse_args(argv)
+    if args.shard:
+        try:
+            args.shard = parse_shard_spec(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.merge:
+        merge_shards(args.merge)
+    elif args.shard:
+        index, count = args.shard
+        seed = args.seed if args.seed is not None else _default_seed()
+        run_shard(index, count, args.budget, args.resume, seed)
+    elif args.local_shards:
+        seed = args.seed if args.seed is not None else _default_seed()
+        run_local_shards(args.local_shards, args.budget, args.resume, seed)
+    else:
+        main(budget_minutes=args.budget, resume=args.resume, seed=args.seed)
@@ -0,0 +1,158 @@
+# landing.py
+"""
+按 Cloudflare 落地 colo 给代理分配地区
+
+代理的国家码只说明出口 IP 的归属，实际落地哪个 colo 取决于路由。检测通过的
+代理再经代理请求一次 Cloudflare 端点，从 CF-Ray 读取 colo 并经 COLO_MAP 得到
+落地地区，代理分配给它实际落地的地区，不再占用国家码所属地区的探测预算。
+
+探测结果按代理（host:port:type）缓存在 COLO_CACHE_FILE，有效期 COLO_CACHE_TTL。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from config import COLO_CACHE_FILE, COLO_CACHE_TTL, COLO_MAP, REGION_CONFIG
+from validator import landing_colos
+
+
+def _key(proxy):
+    return f"{proxy.host}:{proxy.port}:{proxy.type}"
+
+
+class LandingCache:
+    """代理落地 colo 的磁盘缓存，首次使用时读取"""
+
+    def __init__(self, path=COLO_CACHE_FILE, ttl=COLO_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _read(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        now = time.time()
+        return {k: v for k, v in entries.items() if now - v.get("at", 0) <= self.ttl}
+
+    def get(self, proxy):
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            entry = self._entries.get(_key(proxy))
+        return entry["colo"] if entry else None
+
+    def put(self, proxy, colo):
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            self._entries[_key(proxy)] = {"colo": colo, "at": int(time.time())}
+
+    def save(self):
+        """与磁盘上的内容合并后原子写回（分片进程可能同时写）"""
+        with self._lock:
+            if self._entries is None:
+                return
+            entries = self._read()
+            entries.update(self._entries)
+            self._entries = entries
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, separators=(",", ":"))
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logging.debug(f"写入落地 colo 缓存失败: {e}")
+
+
+def classify(proxies, cache, known=None, stop_at=None):
+    """
+    返回与 proxies 一一对应的落地 colo（无法判断为 None）
+
+    known: {id(proxy): colo}，检测阶段已经拿到的 colo（本地检测会读取 CF-Ray），
+    这些代理与缓存命中的代理不再发探测请求
+    stop_at: 截止时刻（time.monotonic()），到点后未探测的代理记为无法判断
+    """
+    known = known or {}
+    colos = [known.get(id(p)) or cache.get(p) for p in proxies]
+    missing = [i for i, colo in enumerate(colos) if colo is None]
+    if missing:
+        for i, colo in zip(missing, landing_colos([proxies[i] for i in missing], stop_at=stop_at)):
+            colos[i] = colo
+    for proxy, colo in zip(proxies, colos):
+        if colo:
+            cache.put(proxy, colo)
+    cache.save()
+    logging.info(f"  落地 colo: {len(proxies) - len(missing)} 个复用, {len(missing)} 个新探测")
+    return colos
+
+
+class LandingAssigner:
+    """
+    一次运行内按落地地区分配代理
+
+    assign(region, ...) 对本地区检测通过的代理做落地分类: 落地本地区或无法判断的
+    留给本地区，落地在其他扫描地区的暂存到该地区名下，该地区获取代理时（assign 或
+    take）并入。各地区按顺序扫描，落地在已扫描地区的代理在补扫时经 take 使用。
+
+    regions: 会扫描的地区（默认 REGION_CONFIG）。落地 colo 不在 COLO_MAP 中、或
+    映射到的地区不扫描时，按落地未知处理留给本地区，不暂存到没有人取的地区名下。
+    """
+
+    def __init__(self, cache, regions=None):
+        self.cache = cache
+        self.regions = set(REGION_CONFIG if regions is None else regions)
+        self._parked = {}       # region -> {key: proxy}
+        self._lock = threading.Lock()
+
+    def _park(self, region, proxy):
+        with self._lock:
+            self._parked.setdefault(region, {}).setdefault(_key(proxy), proxy)
+
+    def take(self, region):
+        """取出暂存的、落地在 region 的代理"""
+        with self._lock:
+            return list(self._parked.pop(region, {}).values())
+
+    def assign(self, region, proxies, known=None, stop_at=None):
+        """
+        返回分配给 region 的代理: 落地本地区的（含其他地区暂存过来的）与落地未知的
+
+        没有任何代理落地本地区或落地未知时，退回按国家码筛选的代理
+        """
+        colos = classify(proxies, self.cache, known, stop_at) if proxies else []
+        landed, unknown, elsewhere = [], [], {}
+        for proxy, colo in zip(proxies, colos):
+            target = COLO_MAP.get(colo) if colo else None
+            if target not in self.regions:
+                unknown.append(proxy)
+                continue
+            if target == region:
+                landed.append(proxy)
+            else:
+                self._park(target, proxy)
+                elsewhere[target] = elsewhere.get(target, 0) + 1
+
+        seen = {_key(p) for p in landed + unknown}
+        parked = [p for p in self.take(region) if _key(p) not in seen]
+        landed.extend(parked)
+
+        if elsewhere:
+            spread = ", ".join(f"{r}×{n}" for r, n in sorted(elsewhere.items(), key=lambda x: -x[1]))
+            logging.info(f"  {region}: {sum(elsewhere.values())} 个代理落地在其他地区 ({spread}),转给对应地区")
+        logging.info(
+            f"  {region}: 落地本地区 {len(landed)} 个(其中 {len(parked)} 个来自其他地区的代理源), "
+            f"落地未知 {len(unknown)} 个"
+        )
+
+        if not landed and not unknown:
+            logging.warning(f"⚠ {region} 无代理落地本地区,保留按国家码筛选的代理")
+            return proxies
+        return landed + unknown
@@ -1,31 +1,177 @@
 import requests
 import logging
 from bs4 import BeautifulSoup
+import io
 import ipaddress
+import json
+import re
+import socket
+import sys
+import threading
 import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    from lxml import etree
+except ImportError:  # lxml 缺失时回退到 BeautifulSoup
+    etree = None
+
+from config import PROXY_SOURCE_DEADLINE, PROXIFLY_HEDGE_DELAY, PARSE_CHUNK_SIZE, PROTOCOL_DETECT
+from httpcache import cached_get
+from ratelimit import rate_limited_get
+
+# 数据源解析时保留的代理类型
+ACCEPTED_PROXY_TYPES = ("https", "socks5", "http", "socks4") if PROTOCOL_DETECT else ("https", "socks5")
+
+
+def _parse_key(name):
+    """解析结果的缓存名: 附带影响解析输出的设置，设置改变后不复用旧的解析结果"""
+    return f"{name}|{','.join(ACCEPTED_PROXY_TYPES)}|{PROTOCOL_DETECT}"
+
+# 代理类型 / 数据源的小整数编码；遇到新名称时追加
+_PROXY_TYPES = ["http", "https", "socks4", "socks5"]
+_PROXY_SOURCES = ["unknown", "proxifly", "proxydaily", "tomcat1235", "monosans"]
+_enum_lock = threading.Lock()
+
+
+def _enum_id(names, value):
+    try:
+        return names.index(value)
+    except ValueError:
+        with _enum_lock:
+            if value not in names:
+                names.append(value)
+            return names.index(value)
+
 
 class ProxyInfo:
-    """统一的代理信息类"""
+    """
+    统一的代理信息类
+
+    合并去重后会同时持有数万个实例，因此使用 __slots__ 紧凑存储:
+    IPv4 地址打包为整数（非 IPv4 的主机名原样保存），类型与来源为小整数编码，
+    国家码驻留（intern），认证信息单独保存为 (username, password)。
+    host / type / source / api_result 等原有属性通过 property 访问。
+    """
+    __slots__ = (
+        "_addr", "port", "_type", "_country", "anonymity", "delay", "_source", "_sources",
+        "_protocols", "tested_latency", "https_ok", "_credentials"
+    )
+
     def __init__(self, host, port, proxy_type, country_code=None, anonymity=None, 
                  delay=None, source="unknown", username=None, password=None):
         self.host = host
         self.port = port
-        self.type = proxy_type.lower()  # https, socks5
-        self.country_code = country_code.upper() if country_code else "UNKNOWN"
+        self.type = proxy_type  # https, socks5
+        self.country_code = country_code
         self.anonymity = anonymity
         self.delay = delay
         self.source = source
+        self._protocols = 0
         self.tested_latency = None
         self.https_ok = False
-        self.api_result = None  # 保存API返回的完整结果
-        
-        # 直接在初始化时处理认证信息
-        if username and password:
-            self.api_result = {
-                "username": username,
-                "password": password
-            }
-        
+        self._credentials = (username, password) if username and password else None
+
+    _STATE = (
+        "host", "port", "type", "country_code", "anonymity", "delay", "source", "sources",
+        "protocols", "tested_latency", "https_ok", "_credentials"
+    )
+
+    def __getstate__(self):
+        # 按名称而非编码保存类型与来源，编码表在不同进程中可能不同
+        return {name: getattr(self, name) for name in self._STATE}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def host(self):
+        addr = self._addr
+        if isinstance(addr, int):
+            return socket.inet_ntoa(addr.to_bytes(4, "big"))
+        return addr
+
+    @host.setter
+    def host(self, value):
+        try:
+            self._addr = int.from_bytes(socket.inet_aton(value), "big")
+        except (OSError, TypeError):
+            self._addr = value
+            return
+        # inet_aton 也接受 "1.2" 之类的简写，只对规范的点分四段地址打包
+        if value.count(".") != 3 or socket.inet_ntoa(self._addr.to_bytes(4, "big")) != value:
+            self._addr = value
+
+    @property
+    def type(self):
+        return _PROXY_TYPES[self._type]
+
+    @type.setter
+    def type(self, value):
+        self._type = _enum_id(_PROXY_TYPES, value.lower())
+
+    @property
+    def protocols(self):
+        """协议探测确认支持的协议（未探测时为空列表）"""
+        return [name for i, name in enumerate(_PROXY_TYPES) if self._protocols >> i & 1]
+
+    @protocols.setter
+    def protocols(self, names):
+        self._protocols = 0
+        for name in names:
+            self._protocols |= 1 << _enum_id(_PROXY_TYPES, name)
+
+    @property
+    def source(self):
+        return _PROXY_SOURCES[self._source]
+
+    @source.setter
+    def source(self, value):
+        self._source = _enum_id(_PROXY_SOURCES, value)
+        self._sources = 1 << self._source
+
+    @property
+    def sources(self):
+        """提供该代理的全部数据源（去重合并后可能多于一个），主来源在前"""
+        names = [self.source]
+        names.extend(
+            name for i, name in enumerate(_PROXY_SOURCES)
+            if self._sources >> i & 1 and i != self._source
+        )
+        return names
+
+    @sources.setter
+    def sources(self, names):
+        for name in names:
+            self._sources |= 1 << _enum_id(_PROXY_SOURCES, name)
+
+    @property
+    def country_code(self):
+        return self._country
+
+    @country_code.setter
+    def country_code(self, value):
+        self._country = sys.intern(value.upper()) if value else "UNKNOWN"
+
+    @property
+    def credentials(self):
+        """(username, password)，无认证时为 None"""
+        return self._credentials
+
+    @property
+    def api_result(self):
+        """兼容旧接口: 只保留 API 结果中的认证信息"""
+        if self._credentials:
+            return {"username": self._credentials[0], "password": self._credentials[1]}
+        return None
+
+    @api_result.setter
+    def api_result(self, result):
+        if result and result.get("username") and result.get("password"):
+            self._credentials = (result["username"], result["password"])
+
     def to_dict(self):
         result = {
             "host": self.host,
@@ -33,16 +179,35 @@ class ProxyInfo:
             "type": self.type,
             "country_code": self.country_code,
             "source": self.source,
+            "sources": self.sources,
             "tested_latency": self.tested_latency,
             "https_ok": self.https_ok
         }
         # 如果有认证信息，添加到字典
-        if self.api_result and self.api_result.get("username"):
+        if self._credentials:
             result["auth"] = {
-                "username": self.api_result["username"],
-                "password": self.api_result["password"]
+                "username": self._credentials[0],
+                "password": self._credentials[1]
             }
         return result
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 to_dict() 的结果还原（用于断点恢复）"""
+        auth = data.get("auth") or {}
+        proxy = cls(
+            host=data["host"],
+            port=data["port"],
+            proxy_type=data["type"],
+            country_code=data.get("country_code"),
+            source=data.get("source", "unknown"),
+            username=auth.get("username"),
+            password=auth.get("password")
+        )
+        proxy.sources = data.get("sources", [])
+        proxy.tested_latency = data.get("tested_latency")
+        proxy.https_ok = data.get("https_ok", False)
+        return proxy
     
     def get_proxy_url(self, protocol="http"):
         """
@@ -54,115 +219,340 @@ class ProxyInfo:
         Returns:
             str: 完整的代理URL
         """
-        if self.api_result and self.api_result.get("username"):
-            username = self.api_result["username"]
-            password = self.api_result["password"]
+        if self._credentials:
+            username, password = self._credentials
             return f"{protocol}://{username}:{password}@{self.host}:{self.port}"
         else:
             return f"{protocol}://{self.host}:{self.port}"
     
     def __repr__(self):
-        auth_info = "[AUTH]" if (self.api_result and self.api_result.get("username")) else ""
+        auth_info = "[AUTH]" if self._credentials else ""
         return f"Proxy({self.host}:{self.port}, {self.type}, {self.country_code}, src={self.source}){auth_info}"
 
 
+# 匿名度由低到高；无法识别的记为 0
+def _anonymity_rank(anonymity):
+    if not anonymity:
+        return 0
+    value = anonymity.lower()
+    if "elite" in value or "high" in value:
+        return 3
+    if "anonymous" in value:
+        return 2
+    if "transparent" in value:
+        return 1
+    return 0
+
+
+def dedupe_proxies(proxies):
+    """
+    跨数据源去重，以 (IP, 端口, 类型) 为键，哈希索引一次遍历
+
+    保留首次出现的实例并合并其余副本的元数据:
+    明确的国家码优先于 UNKNOWN，合并来源列表，取匿名度最高者，
+    补全认证信息与数据源提供的延迟（取最小值）。
+    """
+    index = {}
+    merged = []
+    for proxy in proxies:
+        key = (proxy._addr, proxy.port, proxy._type)
+        kept = index.get(key)
+        if kept is None:
+            index[key] = proxy
+            merged.append(proxy)
+            continue
+
+        if kept.country_code == "UNKNOWN" and proxy.country_code != "UNKNOWN":
+            kept._country = proxy._country
+        kept._sources |= proxy._sources
+        if _anonymity_rank(proxy.anonymity) > _anonymity_rank(kept.anonymity):
+            kept.anonymity = proxy.anonymity
+        if kept._credentials is None:
+            kept._credentials = proxy._credentials
+        if proxy.delay is not None and (kept.delay is None or proxy.delay < kept.delay):
+            kept.delay = proxy.delay
+    return merged
+
+
+# ======================
+# 数据源注册表
+# ======================
+# 新增数据源只需实现 fetch(region, REGION_TO_COUNTRY_CODE) -> [ProxyInfo]
+# 并用 @register_source(名称, timeout) 注册
+SOURCES = {}
+
+_fetch_stats = threading.local()
+
+
+def register_source(name, timeout=PROXY_SOURCE_DEADLINE):
+    """注册代理数据源；timeout 为该数据源自己的截止时间（秒）"""
+    def decorator(fetch):
+        SOURCES[name] = {"fetch": fetch, "timeout": timeout}
+        return fetch
+    return decorator
+
+
+def _source_get(endpoint, url, **kwargs):
+    """限速 GET，并把响应字节数计入当前数据源的统计"""
+    response = rate_limited_get(endpoint, url, **kwargs)
+    stats = getattr(_fetch_stats, "current", None)
+    if stats is not None:
+        stats["bytes"] += len(response.content)
+    return response
+
+
+def _run_source(name, region, region_to_country_code, stats):
+    _fetch_stats.current = stats
+    started = time.monotonic()
+    try:
+        return SOURCES[name]["fetch"](region, region_to_country_code)
+    finally:
+        stats["seconds"] = round(time.monotonic() - started, 2)
+        _fetch_stats.current = None
+
+
+def fetch_all_sources(region, REGION_TO_COUNTRY_CODE, deadline=PROXY_SOURCE_DEADLINE):
+    """
+    并行获取全部已注册数据源的代理
+
+    每个数据源在 min(自身 timeout, deadline) 秒内未返回即放弃，只返回按时到达的结果。
+    返回 (proxies, stats)，stats 为每个数据源的 耗时 / 字节数 / 解析条数 / 状态。
+    """
+    started = time.monotonic()
+    stats = {
+        name: {"source": name, "status": "timeout", "seconds": None, "bytes": 0, "parsed": 0}
+        for name in SOURCES
+    }
+    # 工作线程写自己的计数器，完成后才合并进 stats，超时线程的迟到写入不影响返回值
+    counters = {name: {"seconds": None, "bytes": 0} for name in SOURCES}
+    proxies = []
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(SOURCES)), thread_name_prefix="source")
+    futures = {
+        executor.submit(_run_source, name, region, REGION_TO_COUNTRY_CODE, counters[name]): name
+        for name in SOURCES
+    }
+    expires = {
+        future: started + min(SOURCES[name]["timeout"], deadline)
+        for future, name in futures.items()
+    }
+
+    pending = set(futures)
+    while pending:
+        timeout = max(0.0, min(expires[f] for f in pending) - time.monotonic())
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            name = futures[future]
+            stats[name].update(counters[name])
+            try:
+                result = future.result()
+            except Exception as e:
+                stats[name]["status"] = "error"
+                logging.error(f"  ✗ 数据源 {name} 异常: {e}")
+                continue
+            stats[name]["status"] = "ok"
+            stats[name]["parsed"] = len(result)
+            proxies.extend(result)
+
+        now = time.monotonic()
+        for future in [f for f in pending if expires[f] <= now]:
+            pending.discard(future)
+            stats[futures[future]]["seconds"] = round(now - started, 2)
+            logging.warning(f"  ⏱ 数据源 {futures[future]} 超时,放弃等待")
+
+    # 超时的请求留在后台线程中自行结束，不阻塞本次调用
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    for s in stats.values():
+        logging.info(
+            f"  [{s['source']}] {s['status']} | {s['seconds']}s | "
+            f"{s['bytes'] / 1024:.1f} KB | {s['parsed']} 条"
+        )
+    return proxies, list(stats.values())
+
+
+# ======================
+# 纯文本代理列表解析
+# ======================
+# 每行 [scheme://]a.b.c.d:port；直接在 bytes 上匹配，不解码、不逐行 split
+# 八位组范围由正则保证（不接受前导零），无需再调用 ipaddress 校验
+_OCTET = rb"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+_IP_PORT_LINE = re.compile(
+    rb"^[ \t]*(?:([a-z0-9]+)://)?(" + rb"\.".join([_OCTET] * 4) + rb"):(\d{1,5})[ \t\r]*$",
+    re.MULTILINE
+)
+_SCHEME_IDS = {b"": 0, b"https": 1, b"socks5": 2, b"http": 3, b"socks4": 4}
+
+
+def _iter_chunks(body, size=PARSE_CHUNK_SIZE):
+    view = memoryview(body)
+    for start in range(0, len(view), size):
+        yield view[start:start + size]
+
+
+def iter_ip_ports(chunks):
+    """
+    流式解析 [scheme://]IPv4:port 行，yield (scheme, host, port)
+
+    chunks 为 bytes 块的可迭代对象（跨块的行会被拼接）；scheme 为 str 或 None。
+    以 (IP, 端口, scheme) 打包成的整数去重。
+    """
+    seen = set()
+    tail = b""
+    for chunk in chunks:
+        buf = tail + chunk
+        cut = buf.rfind(b"\n") + 1
+        tail = buf[cut:]
+        if cut:
+            yield from _scan_ip_ports(buf[:cut], seen)
+    if tail:
+        yield from _scan_ip_ports(tail, seen)
+
+
+def _scan_ip_ports(buf, seen):
+    aton = socket.inet_aton
+    from_bytes = int.from_bytes
+    for scheme, host, port in _IP_PORT_LINE.findall(buf):
+        port = int(port)
+        if not 0 < port < 65536:
+            continue
+
+        host = host.decode()
+        key = (from_bytes(aton(host), "big") << 19) | (port << 3) | _SCHEME_IDS.get(scheme, 7)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        yield (scheme.decode() or None), host, port
+
+
+PROXIFLY_BASE_URL = "https://cdn.jsdelivr.net/gh/proxifly/free-proxy-list@main/proxies/countries"
+
+
+def _fetch_proxifly_json(country_code):
+    """Proxifly JSON 格式"""
+    return cached_get(
+        "proxifly", f"{PROXIFLY_BASE_URL}/{country_code}/data.json",
+        partial(_parse_proxifly_json, country_code=country_code),
+        parse_key=_parse_key("json"), getter=_source_get, timeout=15
+    )
+
+
+def _parse_proxifly_json(body, country_code):
+    proxies = []
+    data = json.loads(body)
+    for item in data:
+        try:
+            protocol = item.get('protocol', '').lower()
+            
+            # 扫描只用 https 和 socks5；开启协议探测时保留 http / socks4 交给探测
+            if protocol not in ACCEPTED_PROXY_TYPES:
+                continue
+            
+            proxy = ProxyInfo(
+                host=item['ip'],
+                port=int(item['port']),
+                proxy_type=protocol,
+                country_code=item.get('geolocation', {}).get('country', country_code),
+                anonymity=item.get('anonymity'),
+                source="proxifly"
+            )
+            proxies.append(proxy)
+        except (KeyError, ValueError, TypeError) as e:
+            logging.debug(f"Proxifly JSON 解析错误: {e}")
+            continue
+    return proxies
+
+
+def _fetch_proxifly_txt(country_code):
+    """Proxifly TXT 格式"""
+    return cached_get(
+        "proxifly", f"{PROXIFLY_BASE_URL}/{country_code}/data.txt",
+        partial(_parse_proxifly_txt, country_code=country_code),
+        parse_key=_parse_key("txt"), getter=_source_get, timeout=15
+    )
+
+
+def _parse_proxifly_txt(body, country_code):
+    proxies = []
+    for scheme, host, port in iter_ip_ports(_iter_chunks(body)):
+        # 没有前缀时默认 https（类型不符时由协议探测纠正）
+        proxy_type = scheme or "https"
+        if proxy_type not in ACCEPTED_PROXY_TYPES:
+            continue
+        proxies.append(ProxyInfo(
+            host=host,
+            port=port,
+            proxy_type=proxy_type,
+            country_code=country_code,
+            source="proxifly"
+        ))
+    return proxies
+
+
+@register_source("proxifly", timeout=20)
 def fetch_proxifly_proxies(region, REGION_TO_COUNTRY_CODE):
-    """从 Proxifly 获取代理列表"""
+    """
+    从 Proxifly 获取代理列表
+
+    先请求 JSON；JSON 在 PROXIFLY_HEDGE_DELAY 秒内未返回（或已失败）时并发请求 TXT，
+    采用先成功解析的一方，另一方的结果丢弃。
+    """
     country_code = REGION_TO_COUNTRY_CODE.get(region)
     if not country_code:
         logging.warning(f"Proxifly: {region} 无对应的国家代码")
         return []
 
-    proxies = []
-    
-    # 尝试 JSON 格式
-    json_url = f"https://cdn.jsdelivr.net/gh/proxifly/free-proxy-list@main/proxies/countries/{country_code}/data.json"
+    logging.info(f"[Proxifly] 获取 {region} 的代理...")
+    stats = getattr(_fetch_stats, "current", None)
+
+    def attempt(fetch):
+        # 字节统计计入外层数据源
+        _fetch_stats.current = stats
+        try:
+            return fetch(country_code)
+        finally:
+            _fetch_stats.current = None
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="proxifly")
+    futures = {executor.submit(attempt, _fetch_proxifly_json): "JSON"}
+    pending = set(futures)
+    hedged = False
+    last_error = None
+
     try:
-        logging.info(f"[Proxifly] 获取 {region} 的代理 (JSON)...")
-        response = requests.get(json_url, timeout=15)
-        response.raise_for_status()
-        
-        data = response.json()
-        for item in data:
-            try:
-                protocol = item.get('protocol', '').lower()
-                
-                # 只接受 https 和 socks5，抛弃 http 和 socks4
-                if protocol not in ['https', 'socks5']:
+        while pending:
+            done, pending = wait(
+                pending,
+                timeout=None if hedged else PROXIFLY_HEDGE_DELAY,
+                return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                try:
+                    proxies = future.result()
+                except Exception as e:
+                    last_error = e
+                    logging.debug(f"Proxifly {futures[future]} 失败: {e}")
                     continue
-                
-                proxy = ProxyInfo(
-                    host=item['ip'],
-                    port=int(item['port']),
-                    proxy_type=protocol,
-                    country_code=item.get('geolocation', {}).get('country', country_code),
-                    anonymity=item.get('anonymity'),
-                    source="proxifly"
-                )
-                proxies.append(proxy)
-            except (KeyError, ValueError, TypeError) as e:
-                logging.debug(f"Proxifly JSON 解析错误: {e}")
-                continue
-                
-        logging.info(f"  ✓ Proxifly: {region} 获取 {len(proxies)} 个代理 (JSON)")
-        return proxies
-        
-    except Exception as e:
-        logging.debug(f"Proxifly JSON 失败: {e}, 尝试 TXT 格式...")
-    
-    # 回退到 TXT 格式
-    txt_url = f"https://cdn.jsdelivr.net/gh/proxifly/free-proxy-list@main/proxies/countries/{country_code}/data.txt"
-    try:
-        response = requests.get(txt_url, timeout=15)
-        response.raise_for_status()
-        
-        lines = response.text.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            
-            try:
-                proxy_type = None
-                
-                # 只接受 https:// 和 socks5://，抛弃 http:// 和 socks4://
-                if line.startswith('https://'):
-                    proxy_type = 'https'
-                    line = line.replace('https://', '')
-                elif line.startswith('socks5://'):
-                    proxy_type = 'socks5'
-                    line = line.replace('socks5://', '')
-                elif line.startswith('http://') or line.startswith('socks4://'):
-                    continue  # 抛弃 http 和 socks4
-                else:
-                    # 没有前缀，默认尝试 https
-                    proxy_type = 'https'
-                
-                parts = line.split(':')
-                if len(parts) >= 2:
-                    host = parts[0].strip()
-                    port = int(parts[1].strip())
-                    ipaddress.ip_address(host)
-                    
-                    proxy = ProxyInfo(
-                        host=host,
-                        port=port,
-                        proxy_type=proxy_type,
-                        country_code=country_code,
-                        source="proxifly"
-                    )
-                    proxies.append(proxy)
-            except (ValueError, ipaddress.AddressValueError, IndexError):
-                continue
-        
-        logging.info(f"  ✓ Proxifly: {region} 获取 {len(proxies)} 个代理 (TXT)")
-        return proxies
-        
-    except Exception as e:
-        logging.error(f"  ✗ Proxifly: {region} 失败 - {e}")
-        return []
+                logging.info(f"  ✓ Proxifly: {region} 获取 {len(proxies)} 个代理 ({futures[future]})")
+                return proxies
+
+            if not hedged:
+                # JSON 失败或迟迟未返回: 发出 TXT 请求与之竞速
+                hedged = True
+                txt = executor.submit(attempt, _fetch_proxifly_txt)
+                futures[txt] = "TXT"
+                pending.add(txt)
+    finally:
+        # 落败的请求留在后台自行结束
+        executor.shutdown(wait=False, cancel_futures=True)
 
+    logging.error(f"  ✗ Proxifly: {region} 失败 - {last_error}")
+    return []
 
+
+@register_source("proxydaily", timeout=15)
 def fetch_proxydaily_proxies(region, REGION_TO_COUNTRY_CODE):
     """从 ProxyDaily 获取代理列表（免费版固定1页100条）"""
     proxies = []
@@ -187,8 +577,10 @@ def fetch_proxydaily_proxies(region, REGION_TO_COUNTRY_CODE):
             "_": f"{int(time.time() * 1000)}"
         }
         
-        resp = session.get(
+        resp = _source_get(
+            "proxydaily",
             'https://proxy-daily.com/api/serverside/proxies',
+            session=session,
             headers=headers,
             params=params,
             timeout=15
@@ -208,8 +600,8 @@ def fetch_proxydaily_proxies(region, REGION_TO_COUNTRY_CODE):
                 for protocol in protocols:
                     protocol = protocol.strip().lower()
                     
-                    # 只接受 https 和 socks5，抛弃 http 和 socks4
-                    if protocol not in ['https', 'socks5']:
+                    # 扫描只用 https 和 socks5；开启协议探测时保留 http / socks4 交给探测
+                    if protocol not in ACCEPTED_PROXY_TYPES:
                         continue
                     
                     proxy = ProxyInfo(
@@ -235,7 +627,73 @@ def fetch_proxydaily_proxies(region, REGION_TO_COUNTRY_CODE):
     return proxies
 
 
-def fetch_tomcat1235_proxies(region):
+def _tomcat1235_rows_lxml(body):
+    """lxml iterparse: 逐行产出第一个表格中 tr 的前三个 td 文本，处理完的行立即释放"""
+    table = None
+    for _, tr in etree.iterparse(io.BytesIO(body), events=("end",), tag="tr", html=True, encoding="utf-8"):
+        owner = next(tr.iterancestors("table"), None)
+        if table is None:
+            table = owner
+        elif owner is not table:
+            break
+
+        cells = tr.findall("td")
+        if len(cells) >= 3:
+            yield tuple("".join(td.itertext()) for td in cells[:3])
+
+        tr.clear()
+        while tr.getprevious() is not None:
+            del tr.getparent()[0]
+
+
+def _tomcat1235_rows_bs4(body):
+    soup = BeautifulSoup(body.decode("utf-8", errors="ignore"), 'html.parser')
+    table = soup.find('table')
+    if not table:
+        return
+
+    for row in table.find_all('tr')[1:]:
+        cells = row.find_all('td')
+        if len(cells) >= 3:
+            yield cells[0].text, cells[1].text, cells[2].text
+
+
+def _parse_tomcat1235(body, rows=None):
+    if rows is None:
+        rows = _tomcat1235_rows_lxml if etree is not None else _tomcat1235_rows_bs4
+    proxies = []
+    for protocol, host, port in rows(body):
+        try:
+            protocol = protocol.strip().lower()
+            host = host.strip()
+            port = int(port.strip())
+            
+            # 验证 IP 格式
+            ipaddress.ip_address(host)
+            
+            # 扫描只用 https 和 socks5；开启协议探测时保留 http / socks4 交给探测
+            if protocol not in ACCEPTED_PROXY_TYPES:
+                continue
+            
+            proxy = ProxyInfo(
+                host=host,
+                port=port,
+                proxy_type=protocol,
+                country_code="UNKNOWN",  # 需要后续通过 API 检测补充
+                source="tomcat1235"
+            )
+            proxies.append(proxy)
+            
+        except (ValueError, ipaddress.AddressValueError, IndexError):
+            continue
+
+    if not proxies:
+        logging.debug("Tomcat1235 页面中未解析到代理")
+    return proxies
+
+
+@register_source("tomcat1235", timeout=20)
+def fetch_tomcat1235_proxies(region, REGION_TO_COUNTRY_CODE=None):
     """从 Tomcat1235 获取代理列表"""
     proxies = []
     session = requests.Session()
@@ -253,49 +711,10 @@ def fetch_tomcat1235_proxies(region):
     try:
         # Tomcat1235 免费版固定只有第一页
         url = 'https://tomcat1235.nyc.mn/proxy_list?page=1'
-        resp = session.get(url, headers=headers, timeout=20)
-        resp.raise_for_status()
-        resp.encoding = 'utf-8'
-        
-        soup = BeautifulSoup(resp.text, 'html.parser')
-        table = soup.find('table')
-        if not table:
-            logging.debug("Tomcat1235 页面中未找到代理表格")
-            return proxies
-        
-        trs = table.find_all('tr')[1:]
-        
-        for row in trs:
-            cells = row.find_all('td')
-            if len(cells) < 3:
-                continue
-            
-            try:
-                protocol = cells[0].text.strip().lower()
-                host = cells[1].text.strip()
-                port = int(cells[2].text.strip())
-                
-                # 验证 IP 格式
-                ipaddress.ip_address(host)
-                
-                # 只接受 https 和 socks5，抛弃 http 和 socks4
-                if protocol not in ['https', 'socks5']:
-                    continue
-                
-                proxy = ProxyInfo(
-                    host=host,
-                    port=port,
-                    proxy_type=protocol,
-                    country_code="UNKNOWN",  # 需要后续通过 API 检测补充
-                    source="tomcat1235"
-                )
-                proxies.append(proxy)
-                
-            except (ValueError, ipaddress.AddressValueError, IndexError):
-                continue
-        
-        time.sleep(0.5)
-        
+        proxies = cached_get(
+            "tomcat1235", url, _parse_tomcat1235, parse_key=_parse_key("html"), getter=_source_get,
+            session=session, headers=headers, timeout=20
+        )
     except Exception as e:
         logging.debug(f"Tomcat1235 请求失败: {e}")
     
@@ -303,50 +722,33 @@ def fetch_tomcat1235_proxies(region):
     return proxies
 
 
-def fetch_monosans_socks5_proxies(region):
+def _parse_monosans(body):
+    # 数据格式: IP:PORT
+    return [
+        ProxyInfo(
+            host=host,
+            port=port,
+            proxy_type='socks5',
+            country_code="UNKNOWN",  # 需要后续通过 API 检测补充
+            source="monosans"
+        )
+        for scheme, host, port in iter_ip_ports(_iter_chunks(body))
+        if scheme is None
+    ]
+
+
+@register_source("monosans", timeout=15)
+def fetch_monosans_socks5_proxies(region, REGION_TO_COUNTRY_CODE=None):
     """从 monosans/proxy-list 获取 SOCKS5 代理列表"""
-    proxies = []
     url = "https://raw.githubusercontent.com/monosans/proxy-list/refs/heads/main/proxies/socks5.txt"
     
     logging.info(f"[MonosansProxyList] 获取 {region} 的 SOCKS5 代理...")
     
     try:
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        
-        lines = response.text.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            
-            try:
-                # 数据格式: IP:PORT
-                parts = line.split(':')
-                if len(parts) != 2:
-                    continue
-                
-                host = parts[0].strip()
-                port = int(parts[1].strip())
-                
-                # 验证 IP 格式
-                ipaddress.ip_address(host)
-                
-                proxy = ProxyInfo(
-                    host=host,
-                    port=port,
-                    proxy_type='socks5',
-                    country_code="UNKNOWN",  # 需要后续通过 API 检测补充
-                    source="monosans"
-                )
-                proxies.append(proxy)
-                
-            except (ValueError, ipaddress.AddressValueError, IndexError):
-                continue
-        
+        proxies = cached_get("monosans", url, _parse_monosans, parse_key=_parse_key("socks5"), getter=_source_get, timeout=15)
         logging.info(f"  ✓ MonosansProxyList: 获取 {len(proxies)} 个 SOCKS5 代理 (国家码需API补充)")
         return proxies
         
     except Exception as e:
         logging.error(f"  ✗ MonosansProxyList 获取失败: {e}")
-        return []
\ No newline at end of file
+        return []
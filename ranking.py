@@ -0,0 +1,360 @@
+# ranking.py
+"""
+节点评分与排序
+
+- score_ip / score_ip_multi: 单域名 / 多域名评分
+- StreamingRanker: 探测结果流式聚合为按地区与全局的有界 Top-K
+- top_k_nodes / select_diverse: 输出阶段的排序与多样性选取
+"""
+
+import heapq
+from collections import defaultdict
+
+from config import (
+    PROBE_PORT,
+    LATENCY_LIMIT,
+    DIVERSITY_MAX_PER_SUBNET,
+    DIVERSITY_MIN_COLOS,
+)
+
+# ────────────────────────────────────────────────
+# 评分
+# ────────────────────────────────────────────────
+def score_ip(latencies):
+    """单域名后 latencies 长度最多为1"""
+    if not latencies:
+        return 0
+
+    lat = latencies[0]
+    score = 1 / (1 + lat / 200)
+    score = round(score, 4)
+    return score
+
+
+def score_ip_multi(latencies, domain_count):
+    """多域名稳定性评分（与 ip_v6.score_ip 相同）"""
+    if len(latencies) < 2:
+        return 0
+
+    lat_min = min(latencies)
+    lat_max = max(latencies)
+
+    s_stability = len(latencies) / domain_count
+    s_consistency = max(0.3, 1 - (lat_max - lat_min) / LATENCY_LIMIT)
+    s_latency = 1 / (1 + lat_min / 100)
+
+    return round(s_stability * s_consistency * s_latency, 4)
+
+
+# ────────────────────────────────────────────────
+# 排序
+# ────────────────────────────────────────────────
+def top_k_nodes(nodes, k=None):
+    """
+    按分数降序取前 k 个节点（k 为 None 时全部排序）
+
+    与 sorted(nodes, key=score, reverse=True)[:k] 结果一致（同分保持原顺序）
+    """
+    if k is None or k >= len(nodes):
+        k = len(nodes)
+    if k <= 0:
+        return []
+    return heapq.nlargest(k, nodes, key=lambda x: x["score"])
+
+
+# ────────────────────────────────────────────────
+# 流式 Top-K
+# ────────────────────────────────────────────────
+class _BoundedTop:
+    """
+    有界最小堆，保留 key 最大的 k 个成员
+
+    成员 key 变化时压入新条目，旧条目惰性失效；
+    key 下降时标记 dirty，读取时从候选池重建以保证精确。
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+        self.members = {}
+        self.dirty = False
+
+    def _prune(self):
+        heap, members = self.heap, self.members
+        while heap and members.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def offer(self, ip, key):
+        if self.k <= 0:
+            return
+
+        old = self.members.get(ip)
+        if old is not None:
+            if key == old:
+                return
+            if key < old:
+                self.dirty = True
+            self.members[ip] = key
+            heapq.heappush(self.heap, (key, ip))
+            if len(self.heap) > 4 * self.k:
+                self.heap = [(k, i) for i, k in self.members.items()]
+                heapq.heapify(self.heap)
+            return
+
+        if len(self.members) < self.k:
+            self.members[ip] = key
+            heapq.heappush(self.heap, (key, ip))
+            return
+
+        self._prune()
+        if key > self.heap[0][0]:
+            _, evicted = heapq.heapreplace(self.heap, (key, ip))
+            del self.members[evicted]
+            self.members[ip] = key
+
+    def rebuild(self, keyed):
+        """keyed: 可迭代的 (key, ip)"""
+        self.heap = heapq.nlargest(self.k, keyed)
+        self.heap.reverse()
+        heapq.heapify(self.heap)
+        self.members = {ip: key for key, ip in self.heap}
+        self.dirty = False
+
+    def ranked(self):
+        return sorted(self.members, key=self.members.get, reverse=True)
+
+
+class StreamingRanker:
+    """
+    增量排名: 每个地区一个有界堆 + 一个全局有界堆
+
+    scan_region 每得到一条结果就调用 add()，任意时刻都可以 O(k) 读出
+    各地区 / 全局的 Top-K（排序规则与 top_k_nodes 一致：分数降序，同分先到先得）。
+    """
+
+    def __init__(self, region_k, global_k, domain_count=None):
+        self.region_k = region_k
+        self.global_k = global_k
+        self.domain_count = domain_count
+
+        self._nodes = {}                       # ip -> node
+        self._seq = {}                         # ip -> 首次出现顺序
+        self._owner = {}                       # ip -> 扫描地区
+        self._region_ips = defaultdict(list)   # 扫描地区 -> [ip]
+        self._counts = defaultdict(int)        # 扫描地区 -> 有效节点数
+        self._tops = {}                        # 扫描地区 -> _BoundedTop
+        self._global = _BoundedTop(global_k)
+
+    def _score(self, latencies):
+        if self.domain_count is None:
+            return score_ip(latencies)
+        return score_ip_multi(latencies, self.domain_count)
+
+    def _key(self, ip):
+        return (self._nodes[ip]["score"], -self._seq[ip])
+
+    def add(self, region, result):
+        ip = result["ip"]
+        node = self._nodes.get(ip)
+
+        if node is None:
+            node = {
+                "ip": ip,
+                "port": result.get("port", PROBE_PORT),
+                "region": result["region"],
+                "colo": result["colo"],
+                "latencies": [result["latency"]],
+                "score": 0,
+                "_best": result["latency"],
+            }
+            self._nodes[ip] = node
+            self._seq[ip] = len(self._seq)
+            self._owner[ip] = region
+            self._region_ips[region].append(ip)
+            self._tops.setdefault(region, _BoundedTop(self.region_k))
+        else:
+            node["latencies"].append(result["latency"])
+            if result["latency"] < node["_best"]:
+                node["_best"] = result["latency"]
+                node["port"] = result.get("port", PROBE_PORT)
+                node["region"] = result["region"]
+                node["colo"] = result["colo"]
+
+        score = self._score(node["latencies"])
+        if score == node["score"]:
+            return
+
+        owner = self._owner[ip]
+        if node["score"] <= 0 < score:
+            self._counts[owner] += 1
+        node["score"] = score
+        if score <= 0:
+            return
+
+        key = self._key(ip)
+        self._tops[owner].offer(ip, key)
+        self._global.offer(ip, key)
+
+    def add_many(self, region, results):
+        for r in results:
+            self.add(region, r)
+
+    def _public(self, ip):
+        node = self._nodes[ip]
+        return {k: v for k, v in node.items() if not k.startswith("_")}
+
+    def _valid(self, ips):
+        return [ip for ip in ips if self._nodes[ip]["score"] > 0]
+
+    def top(self, region):
+        """地区 Top-K（分数降序）"""
+        top = self._tops.get(region)
+        if top is None:
+            return []
+        if top.dirty:
+            top.rebuild((self._key(ip), ip) for ip in self._valid(self._region_ips[region]))
+        return [self._public(ip) for ip in top.ranked()]
+
+    def top_global(self):
+        """全局 Top-K（分数降序）"""
+        if self._global.dirty:
+            self._global.rebuild((self._key(ip), ip) for ip in self._valid(self._nodes))
+        return [self._public(ip) for ip in self._global.ranked()]
+
+    def node_count(self, region=None):
+        if region is None:
+            return sum(self._counts.values())
+        return self._counts.get(region, 0)
+
+    def region_nodes(self, region):
+        """地区内全部有效节点（首次出现顺序）"""
+        return [self._public(ip) for ip in self._valid(self._region_ips.get(region, []))]
+
+    def all_nodes(self):
+        """全部有效节点（首次出现顺序）"""
+        return [self._public(ip) for ip in self._valid(self._nodes)]
+
+
+class RegionAccumulator:
+    """
+    单地区增量统计: 有效节点数、结果数与探测数
+
+    每条结果 O(1) 更新，供 scan_region 的阈值判断直接读取，
+    有效节点的判定与 StreamingRanker 相同（单域名 1 条结果、多域名 2 条结果即有分数）。
+    """
+
+    def __init__(self, domain_count=None):
+        self.min_results = 1 if domain_count is None else 2
+        self.hits = defaultdict(int)
+        self.node_count = 0
+        self.result_count = 0
+        self.probes = 0
+
+    def add_probe(self, batch):
+        """记录一次完成的探测（batch 为该探测返回的结果列表，可为空）"""
+        self.probes += 1
+        self.add_many(batch)
+
+    def add(self, result):
+        ip = result["ip"]
+        self.result_count += 1
+        self.hits[ip] += 1
+        if self.hits[ip] == self.min_results:
+            self.node_count += 1
+
+    def add_many(self, results):
+        for r in results:
+            self.add(r)
+
+
+# ────────────────────────────────────────────────
+# 多样性约束选择
+# ────────────────────────────────────────────────
+def _subnet24(ip):
+    return ip.rsplit(".", 1)[0]
+
+
+def select_diverse(nodes, k, max_per_subnet=DIVERSITY_MAX_PER_SUBNET,
+                   min_colos=DIVERSITY_MIN_COLOS):
+    """
+    在约束下选出总分尽量高的 k 个节点
+
+    约束: 每个 /24 最多 max_per_subnet 个；至少覆盖 min_colos 个不同 colo（候选不足时尽力而为）
+
+    1. 按分数贪心选取，跳过已满的 /24
+    2. colo 数不足时，用未覆盖 colo 的最佳节点替换"所在 colo 有重复"的最低分节点（惰性小根堆）
+    复杂度 O(n log n)
+    """
+    if k <= 0 or not nodes:
+        return []
+
+    ranked = top_k_nodes(nodes)
+    order = {id(n): i for i, n in enumerate(ranked)}
+
+    selected = []
+    subnet_count = defaultdict(int)
+    colo_count = defaultdict(int)
+
+    for node in ranked:
+        if len(selected) >= k:
+            break
+        subnet = _subnet24(node["ip"])
+        if subnet_count[subnet] >= max_per_subnet:
+            continue
+        selected.append(node)
+        subnet_count[subnet] += 1
+        colo_count[node["colo"]] += 1
+
+    if len(colo_count) < min_colos:
+        chosen = {id(n) for n in selected}
+
+        # 每个未覆盖 colo 的最佳候选（ranked 已按分数降序）
+        newcomers = {}
+        for node in ranked:
+            if node["colo"] not in colo_count and node["colo"] not in newcomers:
+                newcomers[node["colo"]] = node
+
+        # 可被替换的节点: 分数最低者优先
+        victims = [(n["score"], -order[id(n)], id(n), n) for n in selected]
+        heapq.heapify(victims)
+
+        for node in newcomers.values():
+            if len(colo_count) >= min_colos:
+                break
+
+            subnet = _subnet24(node["ip"])
+            if len(selected) < k:
+                if subnet_count[subnet] >= max_per_subnet:
+                    continue
+                victim = None
+            else:
+                victim = None
+                skipped = []
+                while victims:
+                    entry = heapq.heappop(victims)
+                    cand = entry[3]
+                    if id(cand) not in chosen or colo_count[cand["colo"]] <= 1:
+                        continue
+                    full = subnet_count[subnet] - (_subnet24(cand["ip"]) == subnet)
+                    if full >= max_per_subnet:
+                        skipped.append(entry)
+                        continue
+                    victim = cand
+                    break
+                for entry in skipped:
+                    heapq.heappush(victims, entry)
+                if victim is None:
+                    continue
+
+                chosen.discard(id(victim))
+                selected.remove(victim)
+                subnet_count[_subnet24(victim["ip"])] -= 1
+                colo_count[victim["colo"]] -= 1
+
+            selected.append(node)
+            chosen.add(id(node))
+            subnet_count[subnet] += 1
+            colo_count[node["colo"]] += 1
+
+    selected.sort(key=lambda n: order[id(n)])
+    return selected
@@ -0,0 +1,129 @@
+# ratelimit.py
+"""
+令牌桶限速
+
+每个外部端点（代理检测 API、各代理数据源）一个令牌桶，速率与突发量在
+config.RATE_LIMITS 中配置。线程安全。
+收到 429 / 503 时按 Retry-After 暂停该端点的令牌发放后重试。
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from config import (
+    RATE_LIMITS,
+    RATE_LIMIT_MAX_RETRIES,
+    RATE_LIMIT_DEFAULT_BACKOFF,
+    RATE_LIMIT_MAX_RETRY_AFTER,
+)
+
+
+class TokenBucket:
+    """
+    令牌桶: 每秒补充 rate 个令牌，最多积累 burst 个
+
+    采用预约方式: 取令牌时立即扣减（可为负），返回需要等待的时间，
+    因此并发调用按到达顺序排队，不会出现惊群。
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()   # 暂停期间位于未来，此前不补充令牌
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self._last:
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+    def _reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            deficit = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(0.0, self._last - now) + deficit
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """暂停发放令牌 seconds 秒（Retry-After），暂停期间不积累令牌"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            until = now + seconds
+            if until > self._last:
+                self._tokens = min(self._tokens, 0.0)
+                self._last = until
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(endpoint):
+    """获取端点对应的令牌桶；未在 RATE_LIMITS 中配置的端点不限速（返回 None）"""
+    with _buckets_lock:
+        bucket = _buckets.get(endpoint)
+        if bucket is None and endpoint in RATE_LIMITS:
+            bucket = TokenBucket(**RATE_LIMITS[endpoint])
+            _buckets[endpoint] = bucket
+        return bucket
+
+
+def parse_retry_after(value):
+    """解析 Retry-After（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def rate_limited_get(endpoint, url, session=None, retries=RATE_LIMIT_MAX_RETRIES, **kwargs):
+    """
+    按端点限速的 GET
+
+    429 / 503 时按 Retry-After（缺省时指数退避）暂停该端点后重试，
+    重试用尽后返回最后一次响应，由调用方照常处理状态码。
+    """
+    bucket = get_bucket(endpoint)
+    getter = session.get if session is not None else requests.get
+
+    for attempt in range(retries + 1):
+        if bucket:
+            bucket.acquire()
+
+        response = getter(url, **kwargs)
+        if response.status_code not in (429, 503) or attempt >= retries:
+            return response
+
+        delay = parse_retry_after(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = RATE_LIMIT_DEFAULT_BACKOFF * (2 ** attempt)
+        delay = min(delay, RATE_LIMIT_MAX_RETRY_AFTER)
+
+        logging.warning(f"[{endpoint}] 触发限速 ({response.status_code}),{delay:.1f}s 后重试")
+        if bucket:
+            bucket.pause(delay)
+        else:
+            time.sleep(delay)
+
+    return response
@@ -0,0 +1,591 @@
+# scheduler.py
+"""
+扫描调度辅助组件
+
+- PathStats: 单条探测路径（某个代理或直连）的延迟 / 成功率统计
+- ProxyPool: 按实时成功率、延迟 EWMA 与在途数为每次探测选代理（power of two choices）
+- HedgedProber: 对冲探测，主探测超过该路径 p90 耗时仍未返回时，
+  通过另一条健康路径重复探测，取先返回的有效结果
+- stream_map: 有界派发队列，在途任务数有上限，结果流式产出
+- ConcurrencyLimiter: 按路径自适应的并发上限（AIMD + 延迟梯度）
+- Deadline: 运行级时间预算，按实测吞吐为各地区分配扫描时间
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from config import (
+    CONCURRENCY_LIMITS,
+    CONCURRENCY_LATENCY_TOLERANCE,
+    CONCURRENCY_TIMEOUT_RATE,
+    CONCURRENCY_WINDOW,
+    DEADLINE_OUTPUT_RESERVE,
+    HEDGE_BUDGET_RATIO,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MIN_SUCCESS_RATE,
+    HEDGE_WINDOW,
+    PROXY_POOL_EWMA_ALPHA,
+    PROXY_POOL_EXPLORE,
+    PROXY_POOL_MAX_IN_FLIGHT,
+    PROXY_POOL_MIN_SUCCESS,
+    TIMEOUT,
+)
+
+
+def path_label(proxy):
+    if proxy is None:
+        return "direct"
+    return f"{proxy.host}:{proxy.port}({proxy.type})"
+
+
+class PathStats:
+    """单条路径最近 HEDGE_WINDOW 次探测的耗时与成功率"""
+
+    def __init__(self):
+        self.durations = deque(maxlen=HEDGE_WINDOW)  # 成功探测耗时（秒）
+        self.outcomes = deque(maxlen=HEDGE_WINDOW)   # True / False
+        self.lock = threading.Lock()
+
+    def record(self, duration, ok):
+        with self.lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.durations.append(duration)
+
+    def success_rate(self):
+        with self.lock:
+            if not self.outcomes:
+                return 1.0
+            return sum(self.outcomes) / len(self.outcomes)
+
+    def healthy(self):
+        with self.lock:
+            attempts = len(self.outcomes)
+            if attempts < HEDGE_MIN_SAMPLES:
+                return True
+            return sum(self.outcomes) / attempts >= HEDGE_MIN_SUCCESS_RATE
+
+    def quantile(self, q):
+        with self.lock:
+            if not self.durations:
+                return None
+            ordered = sorted(self.durations)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def hedge_delay(self):
+        """对冲等待时间: 样本足够时取 p90，否则用默认值"""
+        with self.lock:
+            enough = len(self.durations) >= HEDGE_MIN_SAMPLES
+        if not enough:
+            return HEDGE_DEFAULT_DELAY
+        return min(TIMEOUT, max(HEDGE_MIN_DELAY, self.quantile(0.9)))
+
+
+class HedgedProber:
+    """
+    对冲探测
+
+    probe(ip, proxy, cancel) 为实际探测函数，cancel 为 threading.Event，
+    置位后探测应尽快放弃（杀掉 curl 进程）。
+    额外探测总数不超过主探测数 × HEDGE_BUDGET_RATIO。
+
+    pool: 传入 ProxyPool 时，对冲路径先占用该代理在池中的名额（满载则不对冲），
+    结束后归还并反馈耗时与结果；limiter_of(path) 返回路径的 ConcurrencyLimiter，
+    不在池中的路径（直连）的对冲结果反馈给它。主探测的名额与反馈由调用方负责。
+    """
+
+    def __init__(self, probe, proxies, allow_direct=False, max_workers=None,
+                 pool=None, limiter_of=None):
+        self.probe = probe
+        self.proxies = list(proxies)
+        self.allow_direct = allow_direct
+        self.pool = pool
+        self.limiter_of = limiter_of
+        self.stats = {path_label(p): PathStats() for p in self.proxies}
+        self.stats["direct"] = PathStats()
+
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _stats(self, proxy):
+        return self.stats.setdefault(path_label(proxy), PathStats())
+
+    def _take_budget(self):
+        with self._lock:
+            if self.hedges + 1 > self.primaries * HEDGE_BUDGET_RATIO:
+                return False
+            self.hedges += 1
+            return True
+
+    def _pick_alternate(self, proxy):
+        """选另一条健康路径: 成功率最高、p50 最低的代理；没有时按需退回直连"""
+        best, best_key = None, None
+        for p in self.proxies:
+            if p is proxy:
+                continue
+            stats = self._stats(p)
+            if not stats.healthy():
+                continue
+            p50 = stats.quantile(0.5)
+            key = (-stats.success_rate(), p50 if p50 is not None else HEDGE_DEFAULT_DELAY)
+            if best_key is None or key < best_key:
+                best, best_key = p, key
+
+        if best is not None:
+            return best, True
+        if self.allow_direct and proxy is not None and self._stats(None).healthy():
+            return None, True
+        return None, False
+
+    def _reserve(self, path):
+        """为对冲路径占用名额；代理在池中已满载时返回 False"""
+        if self.pool is None or path is None:
+            return True
+        return self.pool.try_acquire(path)
+
+    def _finish_hedge(self, path, duration, ok):
+        """对冲路径结束: 归还名额并反馈；ok 为 None 表示被取消，只归还名额"""
+        if self.pool is not None and path is not None:
+            self.pool.release(path, duration, ok)
+        elif self.limiter_of is not None and ok is not None:
+            self.limiter_of(path).record(duration, ok)
+
+    def _launch(self, ip, proxy):
+        cancel = threading.Event()
+        future = self._executor.submit(self.probe, ip, proxy, cancel)
+        return future, (proxy, cancel, time.monotonic())
+
+    def run(self, ip, proxy):
+        """
+        Returns:
+            (结果, 产出结果的路径)，无有效结果时为 ([], None)。
+            主探测输给对冲时按失败计入主路径的统计
+        """
+        with self._lock:
+            self.primaries += 1
+
+        future, meta = self._launch(ip, proxy)
+        pending = {future: meta}
+
+        done, _ = wait([future], timeout=self._stats(proxy).hedge_delay())
+        if not done:
+            alternate, ok = self._pick_alternate(proxy)
+            if ok and self._reserve(alternate):
+                if self._take_budget():
+                    hedge, hedge_meta = self._launch(ip, alternate)
+                    pending[hedge] = hedge_meta
+                    logging.debug(f"对冲探测 {ip}: {path_label(proxy)} → {path_label(alternate)}")
+                else:
+                    self._finish_hedge(alternate, None, None)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                path, _, started = pending.pop(f)
+                try:
+                    result = f.result()
+                except Exception:
+                    result = []
+                duration = time.monotonic() - started
+                self._stats(path).record(duration, bool(result))
+                if f is not future:
+                    self._finish_hedge(path, duration, bool(result))
+
+                if result:
+                    # 取消落后的探测: 落后的主探测记为失败，落后的对冲只归还名额
+                    now = time.monotonic()
+                    for other, (other_path, cancel, other_started) in pending.items():
+                        cancel.set()
+                        if other is future:
+                            self._stats(other_path).record(now - other_started, False)
+                        else:
+                            self._finish_hedge(other_path, None, None)
+                    if f is not future:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return result, path
+
+        return [], None
+
+    def summary(self):
+        return f"对冲探测 {self.hedges} 次 / 主探测 {self.primaries} 次,对冲胜出 {self.hedge_wins} 次"
+
+
+# ────────────────────────────────────────────────
+# 代理池
+# ────────────────────────────────────────────────
+class _PoolEntry:
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.success = 1.0          # 乐观初值，新代理先获得流量
+        latency = getattr(proxy, "tested_latency", None)
+        self.latency = latency / 1000 if latency else HEDGE_DEFAULT_DELAY
+        self.in_flight = 0
+        self.dispatched = 0
+        self.succeeded = 0
+
+    def cost(self):
+        return self.latency * (self.in_flight + 1) / max(PROXY_POOL_MIN_SUCCESS, self.success)
+
+
+class ProxyPool:
+    """
+    一个地区扫描期间的代理池
+
+    acquire() 在未满载的代理中随机取两个，选代价（延迟 EWMA × (在途 + 1) / 成功率）
+    较小者，满载的代理不会挡住空闲的代理；另有 PROXY_POOL_EXPLORE 的概率随机选一个
+    未满载的代理，让失败过的代理有机会恢复。全部满载时 acquire() 等待。
+    release() 反馈耗时与结果，更新 EWMA。limiter_of(proxy) 返回该代理的
+    ConcurrencyLimiter 时，代理的在途上限随之变化，耗时与结果也会反馈给它。
+    池关闭后 acquire() 返回 None。
+    """
+
+    def __init__(self, proxies, limiter_of=None, rng=None):
+        self.entries = [_PoolEntry(p) for p in proxies]
+        self.limiter_of = limiter_of
+        self.rng = rng or random.Random()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def max_in_flight(self):
+        """所有代理合计的在途上限，用作派发线程数"""
+        if self.limiter_of is None:
+            return PROXY_POOL_MAX_IN_FLIGHT
+        total = sum(self.limiter_of(e.proxy).max_limit for e in self.entries)
+        return max(1, min(PROXY_POOL_MAX_IN_FLIGHT, total))
+
+    def _limit(self, entry):
+        if self.limiter_of is None:
+            return PROXY_POOL_MAX_IN_FLIGHT
+        return self.limiter_of(entry.proxy).current()
+
+    def _ready(self, entry):
+        return entry.in_flight < self._limit(entry)
+
+    def _pick(self):
+        """在未满载的代理中随机取两个，选代价较小者；全部满载时返回 None"""
+        ready = [e for e in self.entries if self._ready(e)]
+        if len(ready) <= 1 or self.rng.random() < PROXY_POOL_EXPLORE:
+            return self.rng.choice(ready) if ready else None
+        a, b = self.rng.sample(ready, 2)
+        return b if b.cost() < a.cost() else a
+
+    def acquire(self):
+        with self._cond:
+            while not self._closed:
+                entry = self._pick()
+                if entry is not None:
+                    entry.in_flight += 1
+                    entry.dispatched += 1
+                    return entry.proxy
+                self._cond.wait(timeout=1.0)
+        return None
+
+    def try_acquire(self, proxy):
+        """不等待地占用指定代理的一个名额（对冲探测用）；满载或池已关闭时返回 False"""
+        with self._cond:
+            entry = next((e for e in self.entries if e.proxy is proxy), None)
+            if self._closed or entry is None or not self._ready(entry):
+                return False
+            entry.in_flight += 1
+            entry.dispatched += 1
+            return True
+
+    def release(self, proxy, duration, ok):
+        """归还名额并反馈耗时与结果；ok 为 None 时（探测被取消）只归还名额"""
+        with self._cond:
+            entry = next(e for e in self.entries if e.proxy is proxy)
+            entry.in_flight -= 1
+            if ok is None:
+                self._cond.notify_all()
+                return
+            entry.success += PROXY_POOL_EWMA_ALPHA * (ok - entry.success)
+            if ok:
+                entry.succeeded += 1
+                entry.latency += PROXY_POOL_EWMA_ALPHA * (duration - entry.latency)
+            self._cond.notify_all()
+        if self.limiter_of is not None:
+            self.limiter_of(proxy).record(duration, ok)
+
+    def run(self, probe, ip):
+        """
+        取一个代理执行 probe(ip, proxy)，返回结果；池已关闭时返回空列表
+
+        probe 返回 (结果, 产出结果的路径)（HedgedProber.run 的约定），
+        只有该代理自己产出结果时才记为成功，对冲胜出时记为失败
+        """
+        proxy = self.acquire()
+        if proxy is None:
+            return []
+        started = time.monotonic()
+        result, winner = [], None
+        try:
+            result, winner = probe(ip, proxy)
+            return result
+        finally:
+            self.release(proxy, time.monotonic() - started, bool(result) and winner is proxy)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def summary(self):
+        """每个代理一行: 派发数、成功数、成功率 EWMA、延迟 EWMA"""
+        with self._cond:
+            entries = sorted(self.entries, key=lambda e: -e.dispatched)
+            return [
+                f"{path_label(e.proxy)}: 派发 {e.dispatched}, 成功 {e.succeeded}, "
+                f"成功率 {e.success:.0%}, 延迟 {e.latency * 1000:.0f}ms"
+                for e in entries
+            ]
+
+
+# ────────────────────────────────────────────────
+# 自适应并发
+# ────────────────────────────────────────────────
+class ConcurrencyLimiter:
+    """
+    单条路径的自适应并发上限
+
+    - 加性增: 成功且耗时未明显膨胀（≤ 最小耗时 × CONCURRENCY_LATENCY_TOLERANCE）时，
+      每次 +1/limit，即每完成一轮约 +1
+    - 乘性减: 窗口内超时比例超过 CONCURRENCY_TIMEOUT_RATE 时减半，
+      每个窗口最多减一次，避免连锁下跌
+    - 利特尔定律: 吞吐 × 平均耗时 = 实际并发，记录到运行元数据用于对照
+    """
+
+    def __init__(self, name, initial, min_limit, max_limit, stall_after):
+        self.name = name
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.stall_after = stall_after
+
+        self.window = deque(maxlen=CONCURRENCY_WINDOW)   # (耗时, 是否超时)
+        self.min_duration = None
+        self.completed = 0
+        self.timeouts = 0
+        self.peak = self.limit
+        self.floor = self.limit
+        self._since_decrease = 0
+        self._started = time.monotonic()
+        self._busy_time = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        return max(self.min_limit, int(self.limit))
+
+    def record(self, duration, ok):
+        timed_out = not ok and duration >= self.stall_after
+        with self._lock:
+            self.completed += 1
+            self._busy_time += duration
+            self._since_decrease += 1
+            self.window.append((duration, timed_out))
+            if timed_out:
+                self.timeouts += 1
+
+            if ok and (self.min_duration is None or duration < self.min_duration):
+                self.min_duration = duration
+
+            timeout_rate = sum(1 for _, t in self.window if t) / len(self.window)
+            if (timeout_rate > CONCURRENCY_TIMEOUT_RATE
+                    and len(self.window) >= CONCURRENCY_WINDOW // 2
+                    and self._since_decrease >= len(self.window)):
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._since_decrease = 0
+            elif ok and duration <= (self.min_duration or duration) * CONCURRENCY_LATENCY_TOLERANCE:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+            self.peak = max(self.peak, self.limit)
+            self.floor = min(self.floor, self.limit)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(1e-6, time.monotonic() - self._started)
+            throughput = self.completed / elapsed
+            mean = self._busy_time / self.completed if self.completed else 0.0
+            return {
+                "limit": self.current(),
+                "peak": int(self.peak),
+                "floor": int(self.floor),
+                "max": self.max_limit,
+                "completed": self.completed,
+                "timeouts": self.timeouts,
+                "throughput": round(throughput, 2),
+                "littles_law": round(throughput * mean, 1),
+            }
+
+
+class LimiterRegistry:
+    """按路径名管理 ConcurrencyLimiter，参数来自 CONCURRENCY_LIMITS[kind]"""
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, kind):
+        with self._lock:
+            limiter = self._limiters.get(name)
+            if limiter is None:
+                limiter = ConcurrencyLimiter(name, **CONCURRENCY_LIMITS[kind])
+                self._limiters[name] = limiter
+            return limiter
+
+    def snapshot(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {l.name: l.snapshot() for l in limiters}
+
+
+# ────────────────────────────────────────────────
+# 有界派发
+# ────────────────────────────────────────────────
+def _drain(pending):
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for f in done:
+        item = pending.pop(f)
+        try:
+            result = f.result()
+        except Exception as e:
+            logging.debug(f"任务失败: {item} - {e}")
+            continue
+        yield item, result
+
+
+def _timed(fn, limiter, is_ok):
+    def run(item):
+        started = time.monotonic()
+        ok = False
+        try:
+            result = fn(item)
+            ok = bool(is_ok(result))
+            return result
+        finally:
+            limiter.record(time.monotonic() - started, ok)
+    return run
+
+
+def stream_map(fn, items, max_workers=None, max_pending=None, cancel=None,
+               limiter=None, is_ok=bool):
+    """
+    有界派发: 在途任务达到上限时生产者阻塞，结果按完成顺序流式产出
+
+    items 可以是生成器，任意时刻最多只有 max_pending 个 future 存在。
+    传入 limiter 时，在途上限随 limiter.current() 动态变化，
+    每个任务的耗时与 is_ok(result) 会反馈给 limiter。
+    调用方提前停止迭代（break）时，取消尚未开始的任务，并置位 cancel
+    通知执行中的任务尽快退出。
+
+    Yields:
+        (item, result)，fn 抛出异常的任务会被跳过
+    """
+    if max_workers is None:
+        max_workers = limiter.max_limit
+    max_pending = max_pending or max_workers * 2
+    if limiter is not None:
+        fn = _timed(fn, limiter, is_ok)
+
+    def capacity():
+        if limiter is None:
+            return max_pending
+        return min(max_pending, max_workers, limiter.current())
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+
+    try:
+        for item in items:
+            while len(pending) >= capacity():
+                yield from _drain(pending)
+            pending[executor.submit(fn, item)] = item
+
+        while pending:
+            yield from _drain(pending)
+    finally:
+        if cancel is not None:
+            cancel.set()
+        for f in pending:
+            f.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ────────────────────────────────────────────────
+# 运行级时间预算
+# ────────────────────────────────────────────────
+class Deadline:
+    """
+    运行级时间预算
+
+    总预算中预留 DEADLINE_OUTPUT_RESERVE 秒给输出阶段（端口探测 + 写文件），
+    其余时间按剩余地区数均分；提前完成的地区省下的时间自动留给后面的地区。
+    根据实测的代理获取耗时与探测吞吐估算每个地区能负担的探测数。
+    spent: 创建之前已经用掉的秒数（自检、获取 IP 段等），预算从进程启动算起。
+    """
+
+    def __init__(self, total_seconds, reserve=DEADLINE_OUTPUT_RESERVE, spent=0.0):
+        self.total = total_seconds
+        self.reserve = min(reserve, total_seconds / 2)
+        self.started = time.monotonic() - max(0.0, spent)
+        self.ends = self.started + total_seconds
+        self.probe_rate = None    # 探测/秒（EWMA）
+        self.proxy_cost = None    # 单地区获取代理耗时（秒，EWMA）
+
+    @staticmethod
+    def _ewma(old, new, alpha=0.5):
+        return new if old is None else old * (1 - alpha) + new * alpha
+
+    def remaining(self):
+        return self.ends - time.monotonic()
+
+    def scan_remaining(self):
+        return self.remaining() - self.reserve
+
+    def expired(self):
+        return self.scan_remaining() <= 0
+
+    def region_stop_at(self, regions_left):
+        """当前地区的截止时刻（monotonic）"""
+        share = max(0.0, self.scan_remaining()) / max(1, regions_left)
+        return time.monotonic() + share
+
+    def observe_proxy_cost(self, seconds):
+        self.proxy_cost = self._ewma(self.proxy_cost, seconds)
+
+    def observe_probes(self, count, seconds):
+        if count > 0 and seconds > 0:
+            self.probe_rate = self._ewma(self.probe_rate, count / seconds)
+
+    def affordable_probes(self, stop_at):
+        """截止前还能完成的探测数；尚无吞吐数据时返回 None（不限制）"""
+        if self.probe_rate is None:
+            return None
+        return int(max(0.0, stop_at - time.monotonic()) * self.probe_rate)
+
+    def summary(self):
+        return {
+            "budget_seconds": int(self.total),
+            "used_seconds": int(time.monotonic() - self.started),
+            "probe_rate": round(self.probe_rate, 2) if self.probe_rate else None,
+            "proxy_cost_seconds": round(self.proxy_cost, 1) if self.proxy_cost else None,
+        }
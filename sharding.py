@@ -0,0 +1,142 @@
+# sharding.py
+"""
+分片扫描
+
+IP 计划中的每个 (地区, IP) 条目经一致性哈希分配到 N 个分片，每个分片扫描全部
+地区中分给自己的那部分 IP（各自获取代理），负载与地区数无关。每个分片独立运行
+（本地进程池或 CI matrix 中的单个 job），把原始结果与代理写入压缩的部分结果文件；
+合并步骤读取全部部分结果，重新聚合、排名，并合并各分片的代理列表后写出。
+"""
+
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+from config import SHARD_FILE_PATTERN, SHARD_VNODES
+from proxy_sources import ProxyInfo, dedupe_proxies
+from ranking import StreamingRanker
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """一致性哈希环，每个分片放置 vnodes 个虚拟节点以平衡负载"""
+
+    def __init__(self, shard_count, vnodes=SHARD_VNODES):
+        ring = sorted(
+            (_hash(f"shard-{shard}#{v}"), shard)
+            for shard in range(shard_count)
+            for v in range(vnodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._shards = [shard for _, shard in ring]
+
+    def shard_of(self, key):
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._shards[i]
+
+
+def shard_plan(region, ips, index, count, ring=None):
+    """返回 region 的 IP 计划中分配给第 index 个分片（0 起）的条目，保持原有顺序"""
+    ring = ring or HashRing(count)
+    return [ip for ip in ips if ring.shard_of(f"{region}/{ip}") == index]
+
+
+def parse_shard_spec(spec):
+    """解析 "i/N"（0 <= i < N）"""
+    try:
+        index, count = (int(x) for x in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"分片格式应为 i/N: {spec}")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片编号超出范围: {spec}")
+    return index, count
+
+
+def partial_path(index, count):
+    return SHARD_FILE_PATTERN.format(index=index, count=count)
+
+
+class RecordingRanker(StreamingRanker):
+    """流式排名的同时按地区保留原始结果，供写入部分结果文件"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.results = {}
+
+    def add(self, region, result):
+        self.results.setdefault(region, []).append(result)
+        super().add(region, result)
+
+
+def write_partial(index, count, ranker, region_proxies, complete, seed, concurrency, deadline=None):
+    """写出分片的部分结果（gzip 压缩的紧凑 JSON），返回文件路径"""
+    path = partial_path(index, count)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    payload = {
+        "shard": index,
+        "count": count,
+        "seed": seed,
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "complete": complete,
+        "regions": list(region_proxies),
+        "results": ranker.results,
+        "proxies": {r: [p.to_dict() for p in proxies] for r, proxies in region_proxies.items()},
+        "concurrency": concurrency,
+        "deadline": deadline.summary() if deadline else None,
+    }
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+    total = sum(len(r) for r in ranker.results.values())
+    logging.info(f"✓ 分片 {index}/{count}: 写出 {total} 条结果 → {path}")
+    return path
+
+
+def load_partials(count):
+    """读取 N 个分片的部分结果；缺失或损坏的分片记录警告后跳过"""
+    partials = []
+    for index in range(count):
+        path = partial_path(index, count)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                partials.append(json.load(f))
+        except FileNotFoundError:
+            logging.warning(f"⚠ 缺少分片 {index}/{count} 的结果文件: {path}")
+        except (OSError, ValueError) as e:
+            logging.warning(f"⚠ 分片 {index}/{count} 的结果文件无法读取: {e}")
+
+    seeds = {p["seed"] for p in partials}
+    if len(seeds) > 1:
+        logging.warning(f"⚠ 各分片的采样种子不一致: {sorted(seeds, key=str)}")
+    return partials
+
+
+def merge_partials(partials, ranker):
+    """
+    把部分结果回放进 ranker，返回 (region_proxies, concurrency, complete)
+
+    每个分片都为全部地区获取代理，同一地区的代理列表取各分片的并集（去重）
+    """
+    region_proxies = {}
+    concurrency = {}
+    for p in partials:
+        for region, results in p["results"].items():
+            ranker.add_many(region, results)
+        for region, proxies in p["proxies"].items():
+            region_proxies.setdefault(region, []).extend(ProxyInfo.from_dict(d) for d in proxies)
+        for name, snap in (p.get("concurrency") or {}).items():
+            concurrency[f"shard{p['shard']}/{name}"] = snap
+
+    region_proxies = {region: dedupe_proxies(proxies) for region, proxies in region_proxies.items()}
+    complete = bool(partials) and len(partials) == partials[0]["count"] and all(p["complete"] for p in partials)
+    return region_proxies, concurrency, complete
@@ -0,0 +1,99 @@
+# test_checkpoint.py
+"""断点的写入 / 恢复，以及只在全部地区扫描完成后才清除断点"""
+
+import os
+
+import ip
+from checkpoint import Checkpoint
+from config import REGION_CONFIG
+from proxy_sources import ProxyInfo
+
+
+def test_checkpoint_round_trip(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+    checkpoint.start(["1.1.1.1", "2.2.2.2"], "US")
+    checkpoint.record_proxies("US", [ProxyInfo("10.0.0.1", 1080, "socks5", "proxifly")])
+    checkpoint.record_probe("US", "1.1.1.1", [{"ip": "1.1.1.1", "latency": 80}])
+    checkpoint.record_probe("US", "2.2.2.2", [])
+    checkpoint.mark_done("US")
+    checkpoint.close()
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"t": "probe", "region": "HK"')     # 中断留下的半行
+
+    state = Checkpoint(checkpoint.path).load()
+    assert state.plan["ips"] == ["1.1.1.1", "2.2.2.2"]
+    assert state.plan["direct_region"] == "US"
+    assert [p.host for p in state.proxies["US"]] == ["10.0.0.1"]
+    assert state.region_probed("US") == {"1.1.1.1", "2.2.2.2"}
+    assert state.region_results("US") == [{"ip": "1.1.1.1", "latency": 80}]
+    assert state.done == {"US"}
+
+    checkpoint.clear()
+    assert not os.path.exists(checkpoint.path)
+    assert checkpoint.load() is None
+
+
+class ExpiringDeadline:
+    """第 expire_after 次询问起报告预算用尽"""
+
+    def __init__(self, expire_after):
+        self.calls = 0
+        self.expire_after = expire_after
+
+    def expired(self):
+        self.calls += 1
+        return self.calls > self.expire_after
+
+    def region_stop_at(self, regions_left):
+        return ip.time.monotonic() + 3600
+
+    def affordable_probes(self, stop_at):
+        return None
+
+    def observe_proxy_cost(self, seconds):
+        pass
+
+
+def _offline(monkeypatch):
+    scanned = []
+    monkeypatch.setattr(ip, "get_proxies", lambda region, stop_at=None: [])
+    monkeypatch.setattr(ip, "detect_direct_region", lambda ips: None)
+    monkeypatch.setattr(ip, "scan_region", lambda region, ips, proxies, **kw: scanned.append(region))
+    monkeypatch.setattr(ip.time, "sleep", lambda seconds: None)
+    return scanned
+
+
+def test_cut_scan_keeps_checkpoint_and_resume_finishes(tmp_path, monkeypatch):
+    scanned = _offline(monkeypatch)
+    cidrs = ["104.16.0.0/24"]
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.jsonl"))
+
+    finished = ip.scan_all(cidrs, ip._new_ranker(), {}, ExpiringDeadline(1), checkpoint)
+    checkpoint.close()
+    first = list(REGION_CONFIG)[0]
+    assert not finished
+    assert scanned == [first]
+
+    state = checkpoint.load()
+    assert state.done == {first}
+
+    scanned.clear()
+    finished = ip.scan_all(cidrs, ip._new_ranker(), {}, None, checkpoint, state)
+    assert finished
+    assert scanned == list(REGION_CONFIG)[1:]
+
+
+def test_main_clears_checkpoint_only_when_finished(tmp_path, monkeypatch):
+    _offline(monkeypatch)
+    path = str(tmp_path / "checkpoint.jsonl")
+    monkeypatch.setattr(ip, "Checkpoint", lambda: Checkpoint(path))
+    monkeypatch.setattr(ip, "_prepare", lambda budget_minutes: ["104.16.0.0/24"])
+    monkeypatch.setattr(ip, "write_outputs", lambda *args, **kwargs: None)
+
+    monkeypatch.setattr(ip, "_new_deadline", lambda budget_minutes: ExpiringDeadline(2))
+    ip.main(budget_minutes=1)
+    assert os.path.exists(path)
+
+    monkeypatch.setattr(ip, "_new_deadline", lambda budget_minutes: None)
+    ip.main(resume=True)
+    assert not os.path.exists(path)
@@ -0,0 +1,69 @@
+# test_httpcache.py
+"""条件请求缓存与解析结果缓存的单元测试（请求用替身）"""
+
+import pytest
+
+import httpcache
+import proxy_sources
+from httpcache import cached_get
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(httpcache, "HTTP_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _getter(calls):
+    def get(endpoint, url, headers=None, **kwargs):
+        calls.append(dict(headers or {}))
+        if "If-None-Match" in (headers or {}):
+            return FakeResponse(304)
+        return FakeResponse(200, b"a\nb\n", {"ETag": '"v1"'})
+    return get
+
+
+def test_not_modified_reuses_body_and_parse(cache_dir):
+    calls, parsed = [], []
+
+    def parse(body):
+        parsed.append(body)
+        return body.split()
+
+    for _ in range(2):
+        assert cached_get("demo", "https://example.invalid/list", parse, getter=_getter(calls)) == [b"a", b"b"]
+
+    assert calls[1]["If-None-Match"] == '"v1"'
+    assert parsed == [b"a\nb\n"]
+
+
+def test_parse_key_separates_results(cache_dir):
+    calls, parsed = [], []
+
+    def parse(body):
+        parsed.append(body)
+        return len(parsed)
+
+    url = "https://example.invalid/list"
+    assert cached_get("demo", url, parse, parse_key="one", getter=_getter(calls)) == 1
+    assert cached_get("demo", url, parse, parse_key="two", getter=_getter(calls)) == 2
+    assert cached_get("demo", url, parse, parse_key="one", getter=_getter(calls)) == 1
+
+
+def test_source_parse_key_tracks_parse_settings(monkeypatch):
+    base = proxy_sources._parse_key("txt")
+    monkeypatch.setattr(proxy_sources, "ACCEPTED_PROXY_TYPES", ("https", "socks5"))
+    narrowed = proxy_sources._parse_key("txt")
+    monkeypatch.setattr(proxy_sources, "PROTOCOL_DETECT", not proxy_sources.PROTOCOL_DETECT)
+    assert len({base, narrowed, proxy_sources._parse_key("txt")}) == 3
@@ -0,0 +1,71 @@
+# test_ip.py
+"""ip.py 输出阶段的单元测试（端口探测用替身，不访问网络）"""
+
+import ip
+from config import HTTPS_PORTS, MAX_OUTPUT_PER_REGION
+
+
+class FakeRanker:
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def top(self, region):
+        return [dict(n) for n in self.nodes if n["region"] == region]
+
+
+def _nodes(region, count):
+    return [
+        {"ip": f"104.16.{i}.1", "port": 443, "region": region, "colo": "LAX" if i % 2 else "SJC",
+         "score": 1.0 - i / 100}
+        for i in range(count)
+    ]
+
+
+def test_sweep_backfills_dead_nodes(monkeypatch):
+    nodes = _nodes("US", MAX_OUTPUT_PER_REGION + 4)
+    dead = {n["ip"] for n in nodes[:2]}
+    swept = []
+
+    def fake_sweep(batch, stop_at=None):
+        swept.append([n["ip"] for n in batch])
+        return {
+            n["ip"]: {"port": None, "ports": {str(p): None for p in HTTPS_PORTS}} if n["ip"] in dead
+            else {"port": 443, "ports": {"443": 100}}
+            for n in batch
+        }
+
+    monkeypatch.setattr(ip, "sweep_ports", fake_sweep)
+    region_top, sweep = ip.sweep_region_top(FakeRanker(nodes), ["US"])
+    kept = ip.apply_port_sweep(region_top["US"], sweep)
+
+    assert len(kept) == MAX_OUTPUT_PER_REGION
+    assert not dead & {n["ip"] for n in kept}
+    assert all(n["ports"] for n in kept)
+    # 第二轮只探测补进来的节点
+    assert len(swept) == 2 and len(swept[1]) == 2
+    assert not set(swept[0]) & set(swept[1])
+
+
+def test_sweep_stops_when_candidates_run_out(monkeypatch):
+    nodes = _nodes("US", 3)
+    monkeypatch.setattr(ip, "sweep_ports", lambda batch, stop_at=None: {
+        n["ip"]: {"port": None, "ports": {str(p): None for p in HTTPS_PORTS}} for n in batch
+    })
+    region_top, sweep = ip.sweep_region_top(FakeRanker(nodes), ["US"])
+    assert region_top == {"US": []}
+    assert len(sweep) == 3
+
+
+def test_direct_supplement_fills_the_candidate_pool(monkeypatch):
+    def fake_test_ip(addr, proxy=None, cancel=None):
+        return [
+            {"ip": addr, "domain": d, "colo": "LAX", "region": "US", "latency": 100}
+            for d in range(ip.DOMAIN_COUNT or 1)
+        ]
+
+    monkeypatch.setattr(ip, "test_ip", fake_test_ip)
+    ips = [f"104.17.{i}.1" for i in range(500)]
+    results = ip.scan_region("US", ips, [])
+
+    target = ip.MAX_OUTPUT_PER_REGION * ip.DIVERSITY_POOL_FACTOR
+    assert target <= len({r["ip"] for r in results}) < len(ips)
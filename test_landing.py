@@ -0,0 +1,58 @@
+# test_landing.py
+"""按落地 colo 分配代理的单元测试（colo 全部预先给出，不发探测请求）"""
+
+import landing
+from landing import LandingAssigner, LandingCache
+from proxy_sources import ProxyInfo
+
+
+def _assigner(tmp_path, regions=("US", "DE")):
+    return LandingAssigner(LandingCache(path=str(tmp_path / "colo.json")), regions=regions)
+
+
+def _proxies(n):
+    return [ProxyInfo(f"10.0.0.{i}", 1080, "socks5", "proxifly") for i in range(n)]
+
+
+def test_landing_elsewhere_is_parked_for_that_region(tmp_path):
+    assigner = _assigner(tmp_path)
+    stay, moved = _proxies(2)
+    known = {id(stay): "LAX", id(moved): "FRA"}
+
+    assert assigner.assign("US", [stay, moved], known) == [stay]
+    assert assigner.take("DE") == [moved]
+    assert assigner.take("DE") == []
+
+
+def test_parked_proxies_join_the_target_region(tmp_path):
+    assigner = _assigner(tmp_path)
+    moved, local = _proxies(2)
+    assigner.assign("US", [moved], {id(moved): "FRA"})
+
+    assert assigner.assign("DE", [local], {id(local): "FRA"}) == [local, moved]
+
+
+def test_unmapped_colo_stays_as_unknown(tmp_path):
+    assigner = _assigner(tmp_path)
+    odd, stay = _proxies(2)
+
+    assigned = assigner.assign("US", [stay, odd], {id(stay): "LAX", id(odd): "ZZZ"})
+    assert assigned == [stay, odd]
+    assert assigner._parked == {}
+
+
+def test_region_outside_the_scan_keeps_the_proxy(tmp_path):
+    assigner = _assigner(tmp_path, regions=("US",))
+    moved = _proxies(1)[0]
+
+    assert assigner.assign("US", [moved], {id(moved): "FRA"}) == [moved]
+    assert assigner.take("DE") == []
+
+
+def test_falls_back_to_country_filter_when_nothing_lands(tmp_path, monkeypatch):
+    monkeypatch.setattr(landing, "landing_colos", lambda proxies, stop_at=None: ["FRA"] * len(proxies))
+    assigner = _assigner(tmp_path)
+    proxies = _proxies(2)
+
+    assert assigner.assign("US", proxies) == proxies
+    assert len(assigner.take("DE")) == 2
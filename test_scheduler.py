@@ -0,0 +1,175 @@
+# test_scheduler.py
+"""scheduler 组件的单元测试（不访问网络）"""
+
+import random
+import threading
+import time
+
+import scheduler
+from proxy_sources import ProxyInfo
+from scheduler import HedgedProber, ProxyPool, path_label, stream_map
+
+
+class FixedLimiter:
+    """固定在途上限、记录反馈的限流器替身"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.max_limit = limit
+        self.records = []
+
+    def current(self):
+        return self.limit
+
+    def record(self, duration, ok):
+        self.records.append((duration, ok))
+
+
+def _proxy(n, latency=None):
+    proxy = ProxyInfo(f"10.0.0.{n}", 1080, "socks5", "proxifly")
+    proxy.tested_latency = latency
+    return proxy
+
+
+def test_pool_skips_full_proxy_without_blocking():
+    fast, slow = _proxy(1, 10), _proxy(2, 500)
+    limiters = {fast.host: FixedLimiter(1), slow.host: FixedLimiter(1)}
+    pool = ProxyPool([fast, slow], limiter_of=lambda p: limiters[p.host], rng=random.Random(0))
+
+    first = pool.acquire()
+    assert first is fast or first is slow
+
+    started = time.monotonic()
+    second = pool.acquire()
+    assert time.monotonic() - started < 0.5
+    assert second is not first
+
+
+def test_pool_waits_only_when_every_proxy_is_full():
+    proxy = _proxy(1, 10)
+    pool = ProxyPool([proxy], limiter_of=lambda p: FixedLimiter(1))
+    assert pool.acquire() is proxy
+
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    time.sleep(0.1)
+    assert not got
+    pool.release(proxy, 0.01, True)
+    waiter.join(timeout=2)
+    assert got == [proxy]
+
+
+def test_fast_proxy_is_not_starved():
+    fast, slow = _proxy(1, 10), _proxy(2, 10)
+    delays = {fast.host: 0.005, slow.host: 0.05}
+    limiters = {p.host: FixedLimiter(4) for p in (fast, slow)}
+    pool = ProxyPool([fast, slow], limiter_of=lambda p: limiters[p.host], rng=random.Random(1))
+
+    def probe(ip, proxy):
+        time.sleep(delays[proxy.host])
+        return [ip], proxy
+
+    started = time.monotonic()
+    count = sum(1 for _ in stream_map(lambda ip: pool.run(probe, ip), range(400), max_workers=8))
+    elapsed = time.monotonic() - started
+    pool.close()
+
+    by_host = {e.proxy.host: e.dispatched for e in pool.entries}
+    assert count == 400
+    assert by_host[fast.host] > 3 * by_host[slow.host]
+    # 只靠慢代理（4 并发 × 50ms）需要 5 秒；快代理满负荷时远低于此
+    assert elapsed < 2.0
+    assert all(e.in_flight == 0 for e in pool.entries)
+
+
+def test_pool_close_releases_waiters():
+    proxy = _proxy(1)
+    pool = ProxyPool([proxy], limiter_of=lambda p: FixedLimiter(1))
+    pool.acquire()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    pool.close()
+    waiter.join(timeout=2)
+    assert got == [None]
+
+
+def _slow_primary(primary):
+    """primary 一直卡到被取消，其他路径立即返回结果"""
+    def probe(ip, proxy, cancel):
+        if proxy is primary:
+            cancel.wait(5)
+            return []
+        return [{"ip": ip, "via": path_label(proxy)}]
+    return probe
+
+
+def _fast_hedging(monkeypatch):
+    monkeypatch.setattr(scheduler, "HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(scheduler, "HEDGE_BUDGET_RATIO", 1.0)
+
+
+def test_hedge_win_is_not_credited_to_primary(monkeypatch):
+    _fast_hedging(monkeypatch)
+    # alternate 的初始延迟高，代理池先选 primary
+    primary, alternate = _proxy(1, 10), _proxy(2, 10000)
+    limiters = {p.host: FixedLimiter(2) for p in (primary, alternate)}
+    pool = ProxyPool([primary, alternate], limiter_of=lambda p: limiters[p.host], rng=random.Random(0))
+    prober = HedgedProber(_slow_primary(primary), [primary, alternate], pool=pool)
+
+    result = pool.run(prober.run, "1.1.1.1")
+    prober.close()
+
+    entries = {e.proxy.host: e for e in pool.entries}
+    assert result[0]["via"] == path_label(alternate)
+    assert prober.hedge_wins == 1
+    assert entries[primary.host].succeeded == 0
+    assert entries[primary.host].success < 1.0
+    assert entries[alternate.host].succeeded == 1
+    assert limiters[primary.host].records[-1][1] is False
+    assert [ok for _, ok in limiters[alternate.host].records] == [True]
+    assert all(e.in_flight == 0 for e in pool.entries)
+    assert list(prober.stats[path_label(primary)].outcomes) == [False]
+
+
+def test_hedge_takes_a_pool_slot_and_skips_full_paths(monkeypatch):
+    _fast_hedging(monkeypatch)
+    primary, alternate = _proxy(1, 10), _proxy(2, 10)
+    limiters = {p.host: FixedLimiter(1) for p in (primary, alternate)}
+    pool = ProxyPool([primary, alternate], limiter_of=lambda p: limiters[p.host])
+    assert pool.try_acquire(alternate)
+
+    def probe(ip, proxy, cancel):
+        time.sleep(0.2)
+        return [ip]
+
+    prober = HedgedProber(probe, [primary, alternate], pool=pool)
+    result, winner = prober.run("1.1.1.1", primary)
+    prober.close()
+
+    assert (result, winner) == (["1.1.1.1"], primary)
+    assert prober.hedges == 0
+    assert limiters[alternate.host].records == []
+
+
+def test_direct_hedge_feeds_direct_limiter(monkeypatch):
+    _fast_hedging(monkeypatch)
+    primary = _proxy(1, 10)
+    direct = FixedLimiter(4)
+    prober = HedgedProber(
+        _slow_primary(primary), [primary], allow_direct=True,
+        limiter_of=lambda p: direct if p is None else FixedLimiter(4)
+    )
+    result, winner = prober.run("1.1.1.1", primary)
+    prober.close()
+
+    assert winner is None and result[0]["via"] == "direct"
+    assert [ok for _, ok in direct.records] == [True]
+
+
+def test_deadline_counts_time_spent_before_creation():
+    deadline = scheduler.Deadline(100, reserve=10, spent=30)
+    assert 59 < deadline.scan_remaining() <= 60
+    assert not deadline.expired()
+    assert scheduler.Deadline(100, reserve=10, spent=95).expired()
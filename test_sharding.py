@@ -0,0 +1,70 @@
+# test_sharding.py
+"""分片切分与部分结果合并的单元测试"""
+
+import random
+
+import pytest
+
+import sharding
+from config import REGION_CONFIG
+from proxy_sources import ProxyInfo
+from sharding import (
+    HashRing, load_partials, merge_partials, parse_shard_spec, shard_plan, write_partial
+)
+
+
+def _plan(seed=1, per_region=60):
+    rng = random.Random(seed)
+    return {
+        region: [f"104.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(per_region)]
+        for region in REGION_CONFIG
+    }
+
+
+@pytest.mark.parametrize("count", [2, 4, 6, 12])
+def test_shard_plan_partitions_every_entry_evenly(count):
+    plan = _plan()
+    ring = HashRing(count)
+    sizes = []
+    for region, ips in plan.items():
+        parts = [shard_plan(region, ips, i, count, ring) for i in range(count)]
+        assert sorted(ip for part in parts for ip in part) == sorted(ips)
+        sizes.append([len(part) for part in parts])
+
+    totals = [sum(column) for column in zip(*sizes)]
+    mean = sum(totals) / count
+    assert min(totals) > 0
+    assert max(totals) < mean * 1.5, totals
+
+
+def test_shard_plan_keeps_order():
+    ips = _plan()["US"]
+    part = shard_plan("US", ips, 0, 2)
+    assert part == [ip for ip in ips if ip in set(part)]
+
+
+def test_parse_shard_spec():
+    assert parse_shard_spec("1/4") == (1, 4)
+    for bad in ("4/4", "-1/2", "x", "1/0"):
+        with pytest.raises(ValueError):
+            parse_shard_spec(bad)
+
+
+def test_merge_unions_proxies_across_shards(tmp_path, monkeypatch):
+    monkeypatch.setattr(sharding, "SHARD_FILE_PATTERN", str(tmp_path / "shard-{index}-of-{count}.json.gz"))
+    shared = ProxyInfo("1.1.1.1", 1080, "socks5", "proxifly", "US")
+    only_second = ProxyInfo("2.2.2.2", 443, "https", "proxydaily", "US")
+
+    for index, proxies in enumerate([[shared], [shared, only_second]]):
+        ranker = sharding.RecordingRanker(30, 200)
+        ranker.add("US", {"ip": f"104.0.0.{index}", "port": 443, "region": "US",
+                          "colo": "LAX", "latency": 100 + index})
+        write_partial(index, 2, ranker, {"US": proxies}, True, 7, {})
+
+    partials = load_partials(2)
+    merged = sharding.StreamingRanker(30, 200)
+    region_proxies, _, complete = merge_partials(partials, merged)
+
+    assert complete
+    assert merged.node_count("US") == 2
+    assert sorted(p.host for p in region_proxies["US"]) == ["1.1.1.1", "2.2.2.2"]
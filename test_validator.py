@@ -0,0 +1,97 @@
+# test_validator.py
+"""validator 批量检测与存活预检的单元测试（只连本机端口上的假代理）"""
+
+import asyncio
+import time
+
+import validator
+from proxy_sources import ProxyInfo
+from validator import filter_alive, landing_colos, liveness_async, validate_many
+
+
+def _proxy():
+    return ProxyInfo("127.0.0.1", 9, "socks5", "proxifly")
+
+
+def test_batches_skip_work_after_stop_at():
+    proxies = [_proxy(), _proxy()]
+    past = time.monotonic() - 1
+
+    started = time.monotonic()
+    assert filter_alive(proxies, stop_at=past) == []
+    assert landing_colos(proxies, stop_at=past) == [None, None]
+    assert [r["success"] for _, r in validate_many(proxies, stop_at=past)] == [False, False]
+    assert time.monotonic() - started < 0.5
+
+
+def _liveness_against(handler, proxy_type="socks5"):
+    """在本机起一个假代理，返回 (liveness_async 结果, proxy)"""
+    async def run():
+        async def serve(reader, writer):
+            try:
+                await handler(reader, writer)
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        proxy = ProxyInfo("127.0.0.1", port, proxy_type, "proxifly")
+        async with server:
+            return await liveness_async(proxy, handshake=True, timeout=1.0), proxy
+
+    return asyncio.run(run())
+
+
+def _socks5(method, rep):
+    async def handler(reader, writer):
+        await reader.readexactly(3)
+        writer.write(bytes([5, method]))
+        await writer.drain()
+        if method != 0:
+            return
+        await reader.read(262)
+        writer.write(bytes([5, rep, 0, 1]) + bytes(6))
+        await writer.drain()
+    return handler
+
+
+def test_liveness_accepts_working_socks5():
+    ms, proxy = _liveness_against(_socks5(0, 0))
+    assert ms is not None
+    assert proxy.protocols == ["socks5"]
+
+
+def test_liveness_rejects_socks5_refusals(monkeypatch):
+    # 开启协议探测时也不能因为问候是 SOCKS5 就算存活
+    monkeypatch.setattr(validator, "PROTOCOL_DETECT", True)
+    assert _liveness_against(_socks5(0, 5))[0] is None       # CONNECT 被拒绝
+    assert _liveness_against(_socks5(2, 0))[0] is None       # 需要认证
+    assert _liveness_against(_socks5(0xFF, 0))[0] is None    # 无可接受的认证方式
+
+
+def test_liveness_rejects_http_connect_refusal(monkeypatch):
+    monkeypatch.setattr(validator, "PROTOCOL_DETECT", True)
+
+    async def handler(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 407 Proxy Authentication Required\r\n\r\n")
+        await writer.drain()
+
+    assert _liveness_against(handler, "https")[0] is None
+
+
+def test_liveness_detects_mislabeled_protocol(monkeypatch):
+    monkeypatch.setattr(validator, "PROTOCOL_DETECT", True)
+
+    async def handler(reader, writer):
+        head = await reader.read(3)
+        if head.startswith(b"\x05"):
+            writer.write(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+        else:
+            await reader.readuntil(b"\r\n\r\n")
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+        await writer.drain()
+
+    ms, proxy = _liveness_against(handler, "socks5")
+    assert ms is not None
+    assert proxy.type == "https"
@@ -8,12 +8,10 @@ import ipaddress
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from config import *
+from ratelimit import rate_limited_get
 from proxy_sources import (
     ProxyInfo,
-    fetch_proxifly_proxies,
-    fetch_proxydaily_proxies,
-    fetch_tomcat1235_proxies,
-    fetch_monosans_socks5_proxies
+    fetch_all_sources
 )
 
 
@@ -28,20 +26,20 @@ def check_proxy_with_api(proxy_info):
     else:
         proxy_url = f"http://{proxy_info.host}:{proxy_info.port}"
 
-    start = time.time()
-
     try:
         params = {"proxy": proxy_url}
         if PROXY_CHECK_API_TOKEN:
             params["token"] = PROXY_CHECK_API_TOKEN
 
-        response = requests.get(
+        response = rate_limited_get(
+            "proxy_check_api",
             PROXY_CHECK_API_URL,
             params=params,
             timeout=PROXY_TEST_TIMEOUT + 2
         )
 
-        latency = int((time.time() - start) * 1000)
+        # 只计请求本身耗时，不含限速排队
+        latency = int(response.elapsed.total_seconds() * 1000)
 
         if response.status_code != 200:
             return {"success": False, "latency": 999999, "https_ok": False}
@@ -113,25 +111,18 @@ def run_internal_tests():
     logging.info("\n[测试 2/4] 代理数据源测试...")
     test_region = "US"
 
-    sources = [
-        ("proxifly",    lambda: fetch_proxifly_proxies(test_region, REGION_TO_COUNTRY_CODE)),
-        ("proxydaily",  lambda: fetch_proxydaily_proxies(test_region, REGION_TO_COUNTRY_CODE)),
-        ("tomcat1235",  lambda: fetch_tomcat1235_proxies(test_region)),
-        ("monosans", lambda: fetch_monosans_socks5_proxies(test_region)),
-    ]
+    fetched_proxies, source_stats = fetch_all_sources(test_region, REGION_TO_COUNTRY_CODE)
 
-    for name, func in sources:
+    for stat in source_stats:
+        name = stat["source"]
         total_tests += 1
-        try:
-            proxies = func()
-            count = len(proxies)
-            test_results["data_sources"][name] = count > 0
-            logging.info(f"    {name}: {count} 个代理")
-            if count > 0:
-                passed_tests += 1
-        except Exception as e:
-            test_results["data_sources"][name] = False
-            logging.error(f"    ✗ {name} 失败: {e}")
+        ok = stat["status"] == "ok" and stat["parsed"] > 0
+        test_results["data_sources"][name] = ok
+        if ok:
+            logging.info(f"    {name}: {stat['parsed']} 个代理")
+            passed_tests += 1
+        else:
+            logging.error(f"    ✗ {name} 失败: {stat['status']}, {stat['parsed']} 个代理")
 
     # 测试 3: API 可用性
     logging.info("\n[测试 3/4] 代理检测 API 测试...")
@@ -141,7 +132,7 @@ def run_internal_tests():
     else:
         try:
             params = {"token": PROXY_CHECK_API_TOKEN} if PROXY_CHECK_API_TOKEN else {}
-            r = requests.get(PROXY_CHECK_API_URL, params=params, timeout=10)
+            r = rate_limited_get("proxy_check_api", PROXY_CHECK_API_URL, params=params, timeout=10)
             if r.status_code in (200, 400, 401):
                 logging.info("  ✓ API 响应正常")
                 test_results["api_check"] = True
@@ -153,12 +144,11 @@ def run_internal_tests():
 
     # 测试 4: 代理连通性抽样
     logging.info("\n[测试 4/4] 代理连通性测试...")
-    all_test_proxies = []
-    for name, func in sources:
-        try:
-            all_test_proxies.extend(func()[:3])
-        except:
-            pass
+    # 从测试 2 已获取的代理中每个数据源取前 3 个
+    per_source = {}
+    for proxy in fetched_proxies:
+        per_source.setdefault(proxy.source, []).append(proxy)
+    all_test_proxies = [p for proxies in per_source.values() for p in proxies[:3]]
 
     working = 0
     tested = min(8, len(all_test_proxies))
@@ -171,7 +161,6 @@ def run_internal_tests():
             if result["success"]:
                 working += 1
                 logging.info(f"    ✓ {proxy.host}:{proxy.port} ({proxy.type}) - {result['latency']}ms")
-            time.sleep(0.4)
 
     test_results["proxy_tests"]["total_tested"] = tested
     test_results["proxy_tests"]["working_count"] = working
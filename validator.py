@@ -0,0 +1,476 @@
+# validator.py
+"""
+本地代理检测（不依赖外部检测 API）
+
+用 asyncio 高并发地直接通过代理建立隧道（SOCKS5 / HTTP CONNECT）到
+VALIDATOR_TARGET，完成 TLS 握手并请求 /cdn-cgi/trace，测量隧道与 TLS 延迟，
+从 trace 中读取出口 IP 与国家码。返回与 check_proxy_with_api 相同结构的结果。
+
+filter_alive 是完整检测前的廉价存活预检（TCP 建连 + 可选握手），
+把大量未监听的免费代理挡在检测 API 之外；握手与标注类型不符时用
+detect_async 探测实际协议（SOCKS5 / SOCKS4 / HTTP CONNECT）并改写类型。
+
+landing_colos 通过代理请求一次 Cloudflare 端点，从 CF-Ray 读取代理的落地 colo。
+"""
+
+import asyncio
+import base64
+import ipaddress
+import logging
+import ssl
+import struct
+import time
+
+from config import (
+    LIVENESS_CONCURRENCY,
+    LIVENESS_HANDSHAKE,
+    LIVENESS_TIMEOUT,
+    PROTOCOL_DETECT,
+    PROTOCOL_DETECT_TIMEOUT,
+    PROXY_MAX_LATENCY,
+    SOCKS5_MAX_LATENCY,
+    VALIDATOR_CONCURRENCY,
+    VALIDATOR_FETCH_TRACE,
+    VALIDATOR_TARGET,
+    VALIDATOR_TIMEOUT,
+)
+
+_FAILED = {"success": False, "latency": 999999, "https_ok": False}
+
+
+class TunnelError(Exception):
+    """代理握手失败（协议不符、拒绝连接或认证失败）"""
+
+
+class TunnelRefused(TunnelError):
+    """对端按标注的协议作答，但拒绝建立隧道（需要认证、认证失败、CONNECT 被拒绝）"""
+
+
+def _ms(seconds):
+    return int(seconds * 1000)
+
+
+def _expired(stop_at):
+    """批量检测的截止判断: 到点后尚未开始的代理直接跳过"""
+    return stop_at is not None and time.monotonic() >= stop_at
+
+
+async def _socks5_connect(reader, writer, host, port, credentials=None):
+    methods = b"\x00\x02" if credentials else b"\x00"
+    writer.write(b"\x05" + bytes([len(methods)]) + methods)
+    await writer.drain()
+
+    ver, method = await reader.readexactly(2)
+    if ver != 5:
+        raise TunnelError("SOCKS5 协商失败")
+    if method == 0xFF:
+        raise TunnelRefused("SOCKS5 无可接受的认证方式")
+    try:
+        await _socks5_request(reader, writer, host, port, method, credentials)
+    except asyncio.IncompleteReadError as e:
+        raise TunnelRefused("SOCKS5 握手中断") from e
+
+
+async def _socks5_request(reader, writer, host, port, method, credentials):
+    """问候已按 SOCKS5 作答: 完成认证与 CONNECT，失败均为 TunnelRefused"""
+    if method == 0x02:
+        if not credentials:
+            raise TunnelRefused("SOCKS5 需要认证")
+        user, password = (x.encode() for x in credentials)
+        writer.write(b"\x01" + bytes([len(user)]) + user + bytes([len(password)]) + password)
+        await writer.drain()
+        _, status = await reader.readexactly(2)
+        if status != 0:
+            raise TunnelRefused("SOCKS5 认证失败")
+
+    name = host.encode()
+    writer.write(b"\x05\x01\x00\x03" + bytes([len(name)]) + name + struct.pack(">H", port))
+    await writer.drain()
+
+    ver, rep, _, atyp = await reader.readexactly(4)
+    if ver != 5 or rep != 0:
+        raise TunnelRefused(f"SOCKS5 CONNECT 被拒绝 (REP={rep})")
+    if atyp == 1:
+        await reader.readexactly(4 + 2)
+    elif atyp == 3:
+        (length,) = await reader.readexactly(1)
+        await reader.readexactly(length + 2)
+    elif atyp == 4:
+        await reader.readexactly(16 + 2)
+    else:
+        raise TunnelRefused("SOCKS5 地址类型无效")
+
+
+async def _http_connect(reader, writer, host, port, credentials=None):
+    lines = [f"CONNECT {host}:{port} HTTP/1.1", f"Host: {host}:{port}"]
+    if credentials:
+        token = base64.b64encode(f"{credentials[0]}:{credentials[1]}".encode()).decode()
+        lines.append(f"Proxy-Authorization: Basic {token}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    await writer.drain()
+
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = head.split(b"\r\n", 1)[0].split()
+    if len(status) < 2 or not status[0].startswith(b"HTTP/"):
+        raise TunnelError(f"CONNECT 失败: {head[:40]!r}")
+    if status[1] != b"200":
+        raise TunnelRefused(f"CONNECT 被拒绝: {head[:40]!r}")
+
+
+TUNNELS = {
+    "socks5": _socks5_connect,
+    "https": _http_connect,
+    "http": _http_connect,
+}
+
+
+async def open_tunnel(proxy, host, port, timeout):
+    """通过代理建立到 host:port 的隧道，返回 (reader, writer)"""
+    tunnel = TUNNELS.get(proxy.type)
+    if tunnel is None:
+        raise TunnelError(f"不支持的代理类型: {proxy.type}")
+
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(proxy.host, proxy.port), timeout
+    )
+    try:
+        await asyncio.wait_for(tunnel(reader, writer, host, port, proxy.credentials), timeout)
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+def _parse_trace(body):
+    fields = {}
+    for line in body.decode(errors="ignore").splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            fields[key.strip()] = value.strip()
+    return fields
+
+
+def _ray_colo(head):
+    """从响应头的 CF-Ray（形如 8f1a2b3c4d5e6f70-HKG）读取 colo"""
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"cf-ray":
+            return value.strip().rsplit(b"-", 1)[-1].decode(errors="ignore").upper() or None
+    return None
+
+
+async def _validate(proxy, ssl_context):
+    host, port, path = VALIDATOR_TARGET
+    started = time.perf_counter()
+    reader, writer = await open_tunnel(proxy, host, port, VALIDATOR_TIMEOUT)
+    try:
+        tunnel_ms = _ms(time.perf_counter() - started)
+
+        tls_started = time.perf_counter()
+        await asyncio.wait_for(
+            writer.start_tls(ssl_context, server_hostname=host), VALIDATOR_TIMEOUT
+        )
+        tls_ms = _ms(time.perf_counter() - tls_started)
+
+        trace = {}
+        if VALIDATOR_FETCH_TRACE:
+            writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), VALIDATOR_TIMEOUT)
+            head, _, body = response.partition(b"\r\n\r\n")
+            status = head.split(b"\r\n", 1)[0].split()
+            if len(status) < 2 or status[1] != b"200":
+                raise TunnelError("trace 请求失败")
+            trace = _parse_trace(body)
+            trace.setdefault("colo", _ray_colo(head))
+    finally:
+        writer.close()
+
+    return tunnel_ms, tls_ms, trace
+
+
+def _apply(proxy, tunnel_ms, tls_ms, trace):
+    """按 check_proxy_with_api 的约定更新代理并生成结果"""
+    latency = tunnel_ms + tls_ms
+    country_code = trace.get("loc", "UNKNOWN")
+    if proxy.country_code == "UNKNOWN" and country_code != "UNKNOWN":
+        proxy.country_code = country_code
+
+    max_latency = SOCKS5_MAX_LATENCY if proxy.type == "socks5" else PROXY_MAX_LATENCY
+    if latency > max_latency:
+        return {"success": False, "latency": latency, "https_ok": False}
+
+    proxy.tested_latency = latency
+    proxy.https_ok = True
+
+    exit_ip = trace.get("ip")
+    try:
+        exit_ip = str(ipaddress.ip_address(exit_ip)) if exit_ip else None
+    except ValueError:
+        exit_ip = None
+
+    return {
+        "success": True,
+        "latency": latency,
+        "https_ok": True,
+        "country_code": country_code,
+        "tunnel_ms": tunnel_ms,
+        "tls_ms": tls_ms,
+        "exit_ip": exit_ip,
+        "colo": trace.get("colo"),
+    }
+
+
+async def validate_async(proxy, ssl_context=None):
+    ssl_context = ssl_context or ssl.create_default_context()
+    try:
+        tunnel_ms, tls_ms, trace = await _validate(proxy, ssl_context)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError, ssl.SSLError, TunnelError) as e:
+        logging.debug(f"代理 {proxy.host}:{proxy.port} 本地检测失败: {e!r}")
+        return dict(_FAILED)
+    return _apply(proxy, tunnel_ms, tls_ms, trace)
+
+
+async def _validate_many(proxies, concurrency, stop_at=None):
+    ssl_context = ssl.create_default_context()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(proxy):
+        async with semaphore:
+            if _expired(stop_at):
+                return proxy, dict(_FAILED)
+            return proxy, await validate_async(proxy, ssl_context)
+
+    return await asyncio.gather(*(one(p) for p in proxies))
+
+
+def validate_many(proxies, concurrency=VALIDATOR_CONCURRENCY, stop_at=None):
+    """
+    并发检测一批代理，返回 [(proxy, result)]，顺序与输入一致
+
+    stop_at: 截止时刻（time.monotonic()），到点后未开始检测的代理记为失败
+    """
+    if not proxies:
+        return []
+    return asyncio.run(_validate_many(list(proxies), concurrency, stop_at))
+
+
+async def landing_colo_async(proxy, ssl_context=None, timeout=VALIDATOR_TIMEOUT):
+    """通过代理向 VALIDATOR_TARGET 发一次请求，只读响应头，返回 CF-Ray 中的落地 colo；失败返回 None"""
+    host, port, path = VALIDATOR_TARGET
+    ssl_context = ssl_context or ssl.create_default_context()
+    try:
+        reader, writer = await open_tunnel(proxy, host, port, timeout)
+        try:
+            await asyncio.wait_for(
+                writer.start_tls(ssl_context, server_hostname=host), timeout
+            )
+            writer.write(
+                f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode()
+            )
+            await writer.drain()
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        finally:
+            writer.close()
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError, ssl.SSLError, TunnelError) as e:
+        logging.debug(f"代理 {proxy.host}:{proxy.port} 落地探测失败: {e!r}")
+        return None
+    return _ray_colo(head)
+
+
+def landing_colos(proxies, concurrency=VALIDATOR_CONCURRENCY, stop_at=None):
+    """并发探测一批代理的落地 colo，返回与输入一一对应的列表（失败或到 stop_at 未开始为 None）"""
+    if not proxies:
+        return []
+    proxies = list(proxies)
+
+    async def run():
+        ssl_context = ssl.create_default_context()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(proxy):
+            async with semaphore:
+                if _expired(stop_at):
+                    return None
+                return await landing_colo_async(proxy, ssl_context)
+
+        return await asyncio.gather(*(one(p) for p in proxies))
+
+    return asyncio.run(run())
+
+
+# 扫描可用的协议，按优先级排列
+USABLE_TYPES = ("socks5", "https")
+
+
+async def _probe_greeting(proxy, timeout):
+    """
+    发送 SOCKS5 问候并按首个回复字节判断协议:
+    0x05 → SOCKS5；0x00 → SOCKS4（对版本号不符的请求回复 VN=0）；
+    "HTTP/" 或不回复 → 可能是 HTTP 代理
+    """
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(proxy.host, proxy.port), timeout
+    )
+    try:
+        writer.write(b"\x05\x01\x00")
+        await writer.drain()
+        try:
+            reply = await asyncio.wait_for(reader.read(5), timeout)
+        except asyncio.TimeoutError:
+            return "http?"
+    finally:
+        writer.close()
+
+    if reply[:1] == b"\x05":
+        return "socks5"
+    if reply[:1] == b"\x00":
+        return "socks4"
+    if reply.startswith(b"HTTP/") or not reply:
+        return "http?"
+    return None
+
+
+async def detect_async(proxy, timeout=PROTOCOL_DETECT_TIMEOUT):
+    """
+    探测代理实际支持的协议，记录到 proxy.protocols，
+    并把 proxy.type 改为可用于扫描的协议；返回是否可用于扫描
+    """
+    try:
+        kind = await _probe_greeting(proxy, timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    protocols = []
+    if kind in ("socks5", "socks4"):
+        protocols.append(kind)
+    elif kind == "http?":
+        # HTTP 代理: 另开一个连接确认是否支持 CONNECT
+        host, port, _ = VALIDATOR_TARGET
+        original = proxy.type
+        proxy.type = "https"
+        try:
+            _, writer = await open_tunnel(proxy, host, port, timeout)
+            writer.close()
+            protocols.extend(["https", "http"])
+        except TunnelError:
+            protocols.append("http")
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        proxy.type = original
+
+    proxy.protocols = protocols
+    usable = [t for t in USABLE_TYPES if t in protocols]
+    if usable and proxy.type != usable[0]:
+        logging.debug(f"代理 {proxy.host}:{proxy.port} 协议探测: {proxy.type} → {usable[0]}")
+        proxy.type = usable[0]
+    return bool(usable)
+
+
+def detect_protocols(proxies, concurrency=LIVENESS_CONCURRENCY, stop_at=None):
+    """并发探测一批代理的协议，返回可用于扫描的代理（类型已改写），到 stop_at 未开始的视为不可用"""
+    if not proxies:
+        return []
+    proxies = list(proxies)
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(proxy):
+            async with semaphore:
+                if _expired(stop_at):
+                    return False
+                return await detect_async(proxy)
+
+        return await asyncio.gather(*(one(p) for p in proxies))
+
+    usable = asyncio.run(run())
+    return [p for p, ok in zip(proxies, usable) if ok]
+
+
+def _mark_handshake(proxy):
+    """标注类型的握手已成功: 记录协议，支持 CONNECT 的 http 代理改写为 https"""
+    if proxy.type == "socks5":
+        proxy.protocols = ["socks5"]
+    elif proxy.type in ("https", "http"):
+        proxy.protocols = ["https", "http"]
+        proxy.type = "https"
+
+
+async def liveness_async(proxy, handshake=LIVENESS_HANDSHAKE, timeout=LIVENESS_TIMEOUT):
+    """
+    存活预检: TCP 建连（handshake=True 时再完成 SOCKS5 / CONNECT 握手到检测目标）
+
+    开启 PROTOCOL_DETECT 时，端口在监听但按标注类型握手失败（协议不符时对端常常
+    直接断开或不回复）的代理改用 detect_async 探测实际协议；只有探测出的协议与
+    标注的不同（问候本身失败）才算存活。对端按标注协议作答却拒绝建立隧道
+    （SOCKS5 REP≠0、需要认证、CONNECT 非 200）时不可用，不再探测。
+    返回耗时（毫秒），不可用时返回 None。
+    """
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(proxy.host, proxy.port), timeout
+        )
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+    try:
+        if handshake:
+            tunnel = TUNNELS.get(proxy.type)
+            if tunnel is None:
+                raise TunnelError(f"不支持的代理类型: {proxy.type}")
+            host, port, _ = VALIDATOR_TARGET
+            await asyncio.wait_for(tunnel(reader, writer, host, port, proxy.credentials), timeout)
+    except TunnelRefused:
+        writer.close()
+        return None
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError, TunnelError):
+        writer.close()
+        labeled = TUNNELS.get(proxy.type)
+        if not (PROTOCOL_DETECT and await detect_async(proxy)):
+            return None
+        if handshake and TUNNELS.get(proxy.type) is labeled:
+            return None     # 标注的协议没错，是握手本身失败
+        return _ms(time.perf_counter() - started)
+    writer.close()
+
+    if PROTOCOL_DETECT:
+        if handshake:
+            _mark_handshake(proxy)
+        elif proxy.type not in USABLE_TYPES and not await detect_async(proxy):
+            return None
+    return _ms(time.perf_counter() - started)
+
+
+async def _filter_alive(proxies, handshake, concurrency, stop_at=None):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(proxy):
+        async with semaphore:
+            if _expired(stop_at):
+                return None
+            return await liveness_async(proxy, handshake)
+
+    return await asyncio.gather(*(one(p) for p in proxies))
+
+
+def filter_alive(proxies, handshake=LIVENESS_HANDSHAKE, concurrency=LIVENESS_CONCURRENCY, stop_at=None):
+    """并发存活预检，返回存活的代理（按建连耗时升序），到 stop_at 未开始预检的视为不存活"""
+    if not proxies:
+        return []
+    proxies = list(proxies)
+    timings = asyncio.run(_filter_alive(proxies, handshake, concurrency, stop_at))
+    alive = [(ms, i) for i, ms in enumerate(timings) if ms is not None]
+    alive.sort()
+    return [proxies[i] for _, i in alive]
+
+
+def check_proxy_local(proxy_info):
+    """单个代理的同步检测，返回值同 check_proxy_with_api"""
+    return asyncio.run(validate_async(proxy_info))